@@ -0,0 +1,127 @@
+"""
+Builds the site's static assets and keeps them in memory, so that reruns do not read them from disk again.
+
+Files in static/ are served by streamlit at app/static/ (see .streamlit/config.toml). Before deploying, self-host the
+Lato font and optimise the images with:
+
+    python assets.py
+
+Without the font, the CSS imports it from Google Fonts. Images are also optimised when they are first shown.
+"""
+import functools
+import hashlib
+import html
+import os
+import re
+import tempfile
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+STATIC = ROOT / "static"
+STATIC_URL = "app/static"
+
+FONT_CSS_URL = "https://fonts.googleapis.com/css2?family=Lato&display=swap"
+FONT_IMPORT = re.compile(r"@import\s+url\(['\"]?https://fonts\.googleapis\.com/[^)]*\)\s*;")
+
+IMAGES = ["content/reading_bar.png"]
+IMAGE_WIDTHS = (800, 1600)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def write_atomically(path: Path, data: bytes):
+    """Writes data to path so that other sessions never see a half written file."""
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+        file.write(data)
+    os.replace(file.name, path)
+
+
+def minify_css(css: str) -> str:
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+@functools.cache
+def custom_css(path: str = "custom.css") -> str:
+    """The site's CSS, minified, with the self-hosted font in place of the Google Fonts import if it was built."""
+    css = (ROOT / path).read_text(encoding="utf-8")
+    font_css = STATIC / "fonts" / "lato.css"
+    if font_css.exists():
+        css = FONT_IMPORT.sub(lambda _: font_css.read_text(encoding="utf-8"), css)
+    return minify_css(css)
+
+
+@functools.cache
+def optimized_image(path: str, widths: tuple[int, ...] = IMAGE_WIDTHS) -> dict[int, str]:
+    """
+    Writes WebP copies of the image at path, resized to each width (but never enlarged), and returns their URLs by
+    width. The names of the copies contain a hash of the image, so browsers can cache them for good.
+    """
+    from PIL import Image
+
+    source = ROOT / path
+    digest = content_hash(source.read_bytes())
+    target_dir = STATIC / "img"
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    urls = {}
+    with Image.open(source) as image:
+        for width in sorted({min(width, image.width) for width in widths}):
+            name = f"{source.stem}.{digest}.{width}.webp"
+            target = target_dir / name
+            if not target.exists():
+                resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+                with tempfile.SpooledTemporaryFile() as buffer:
+                    resized.save(buffer, "WEBP", quality=80, method=6)
+                    buffer.seek(0)
+                    write_atomically(target, buffer.read())
+            # Tornado serves static files with a long cache lifetime when they are requested with a version.
+            urls[width] = f"{STATIC_URL}/img/{name}?v={digest}"
+    return urls
+
+
+def image_html(path: str, alt: str = "") -> str:
+    """An img tag which lets the browser pick the smallest optimised copy of the image that fills the page."""
+    urls = optimized_image(path)
+    srcset = ", ".join(f"{url} {width}w" for width, url in urls.items())
+    alt = html.escape(alt, quote=True)
+    return f'<img src="{urls[max(urls)]}" srcset="{srcset}" sizes="100vw" alt="{alt}" style="width: 100%">'
+
+
+def build_font():
+    """Downloads Lato from Google Fonts into static/fonts, with a stylesheet which points at the downloaded files."""
+    fonts_dir = STATIC / "fonts"
+    fonts_dir.mkdir(parents=True, exist_ok=True)
+
+    # Google Fonts only serves WOFF2 to browsers which it knows support it.
+    request = urllib.request.Request(FONT_CSS_URL, headers={"User-Agent": "Mozilla/5.0 Chrome/120.0"})
+    with urllib.request.urlopen(request) as response:
+        css = response.read().decode("utf-8")
+
+    def download(match: re.Match) -> str:
+        with urllib.request.urlopen(match.group(1)) as response:
+            data = response.read()
+        digest = content_hash(data)
+        name = f"lato.{digest}.woff2"
+        write_atomically(fonts_dir / name, data)
+        return f"url({STATIC_URL}/fonts/{name}?v={digest})"
+
+    css = re.sub(r"url\((https://[^)]+)\)", download, css)
+    write_atomically(fonts_dir / "lato.css", css.encode("utf-8"))
+
+
+def main():
+    build_font()
+    print(f"Wrote {STATIC / 'fonts'}")
+    for path in IMAGES:
+        for width, url in optimized_image(path).items():
+            print(f"Wrote {path} at {width}px to {url}")
+
+
+if __name__ == "__main__":
+    main()
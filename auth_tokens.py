@@ -0,0 +1,184 @@
+import base64
+import hashlib
+import heapq
+import hmac
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class ExpiredToken(InvalidToken):
+    pass
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens locally with the project's JWT secret, so logging in does not need a round trip
+    to Supabase.
+
+    verify() returns None when a token cannot be checked locally (no secret is configured, or the token is signed with
+    another algorithm), in which case it should be checked with Supabase instead.
+    """
+
+    def __init__(self, secret: Optional[str], audience: str = "authenticated", leeway: float = 0):
+        self._key = secret.encode("utf-8") if secret else None
+        self.audience = audience
+        self.leeway = leeway
+
+    def verify(self, token: str) -> Optional[dict]:
+        """Returns the claims of token, or None if it cannot be checked locally. Raises InvalidToken if it is bad."""
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            header = json.loads(_b64decode(header_segment))
+            claims = json.loads(_b64decode(payload_segment))
+            signature = _b64decode(signature_segment)
+        except ValueError as e:
+            raise InvalidToken(f"The token is malformed: {e}")
+
+        if self._key is None or header.get("alg") != "HS256":
+            return None
+
+        expected = hmac.new(self._key, f"{header_segment}.{payload_segment}".encode("ascii"), hashlib.sha256)
+        if not hmac.compare_digest(expected.digest(), signature):
+            raise InvalidToken("The token signature does not match")
+
+        if "exp" not in claims or claims["exp"] + self.leeway <= time.time():
+            raise ExpiredToken("The token has expired")
+
+        audience = claims.get("aud")
+        if audience != self.audience and not (isinstance(audience, list) and self.audience in audience):
+            raise InvalidToken("The token is not for this audience")
+
+        return claims
+
+
+class AuthSession:
+    """The tokens of a logged in session. They are replaced in place when the session is refreshed."""
+
+    __slots__ = ("access_token", "refresh_token", "expires_at", "user_id", "last_seen")
+
+    def __init__(self, access_token: str, refresh_token: str, expires_at: float, user_id: Optional[str] = None):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = expires_at
+        self.user_id = user_id
+        self.last_seen = time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at <= time.time()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def idle(self) -> float:
+        """Seconds since the session was last used."""
+        return time.monotonic() - self.last_seen
+
+
+class AuthClients:
+    """
+    The auth client of each session, so that sessions do not overwrite each other's login. Clients not used for
+    ``idle_timeout`` seconds are dropped, and so are the least recently used once there are ``max_clients``. Dropped
+    clients are not closed, as they share one HTTP client.
+    """
+
+    def __init__(self, create: Callable[[str], object], max_clients: int = 1000, idle_timeout: float = 1800):
+        self.create = create
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self._clients: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.pop(session_id, None)
+            client = entry[1] if entry else self.create(session_id)
+
+            # The clients are kept in order of use, so the idle ones are at the front.
+            while self._clients:
+                oldest, (last_used, _) = next(iter(self._clients.items()))
+                if now - last_used <= self.idle_timeout and len(self._clients) < self.max_clients:
+                    break
+                del self._clients[oldest]
+
+            self._clients[session_id] = (now, client)
+        return client
+
+    def remove(self, session_id: str):
+        with self._lock:
+            self._clients.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._clients)
+
+
+class RefreshScheduler:
+    """
+    Refreshes tokens from a background thread, ``margin`` seconds before they expire.
+
+    A refresh function returns the expiry time of the new token to be refreshed again, or None to stop. If it raises,
+    the token is not refreshed again.
+    """
+
+    def __init__(self, margin: float = 60):
+        self.margin = margin
+        self._queue: list[tuple[float, int, str]] = []
+        self._scheduled: dict[str, tuple[int, Callable[[], Optional[float]]]] = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, key: str, expires_at: float, refresh: Callable[[], Optional[float]]):
+        """Calls refresh before expires_at (a unix timestamp), replacing any refresh already scheduled for key."""
+        with self._condition:
+            entry = next(self._counter)
+            self._scheduled[key] = (entry, refresh)
+            heapq.heappush(self._queue, (expires_at - self.margin, entry, key))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def cancel(self, key: str):
+        with self._condition:
+            self._scheduled.pop(key, None)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._scheduled
+
+    def _run(self):
+        while True:
+            with self._condition:
+                # Entries which were replaced or cancelled are skipped when they come up.
+                while not self._queue or self._queue[0][0] > time.time():
+                    self._condition.wait(self._queue[0][0] - time.time() if self._queue else None)
+                due, entry, key = heapq.heappop(self._queue)
+                if key not in self._scheduled or self._scheduled[key][0] != entry:
+                    continue
+                _, refresh = self._scheduled[key]
+
+            try:
+                expires_at = refresh()
+            except Exception:
+                expires_at = None
+
+            with self._condition:
+                # The key stays scheduled while it is refreshed, so that it can be cancelled or replaced meanwhile.
+                if key in self._scheduled and self._scheduled[key][0] == entry:
+                    if expires_at is None:
+                        del self._scheduled[key]
+                    else:
+                        self.schedule(key, expires_at, refresh)
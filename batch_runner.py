@@ -0,0 +1,137 @@
+"""
+Runs one prompt template over every row of a CSV or JSONL file, such as a file of contract clauses, several rows at a
+time. The template names the columns to fill in with Python's format syntax, e.g. "Rewrite this clause: {clause}".
+"""
+import csv
+import io
+import json
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional
+
+from templating import fill_template
+
+
+class BatchRow:
+    """A row of the file, and how far it has got: queued, running, done, failed or cancelled."""
+
+    __slots__ = ("index", "values", "status", "attempts", "output", "error")
+
+    def __init__(self, index: int, values: dict[str, str]):
+        self.index = index
+        self.values = values
+        self.status = "queued"
+        self.attempts = 0
+        self.output: Optional[str] = None
+        self.error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "row": self.index + 1,
+            **self.values,
+            "status": self.status,
+            "attempts": self.attempts,
+            "output": self.output,
+            "error": self.error,
+        }
+
+
+def read_rows(data: bytes, name: str) -> list[BatchRow]:
+    """Reads the rows of a CSV file, or a JSONL file of objects. Raises ValueError if the file cannot be read."""
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("The file must be UTF-8 encoded")
+
+    if name.lower().endswith((".jsonl", ".ndjson")):
+        rows = []
+        for number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                values = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {number} is not valid JSON: {e.msg}")
+            if not isinstance(values, dict):
+                raise ValueError(f"Line {number} is not a JSON object")
+            rows.append({key: "" if value is None else str(value) for key, value in values.items()})
+    elif name.lower().endswith(".csv"):
+        rows = [
+            {key: value or "" for key, value in values.items() if key is not None}
+            for values in csv.DictReader(io.StringIO(text))
+        ]
+    else:
+        raise ValueError("The file must be a CSV or JSONL file")
+
+    return [BatchRow(index, values) for index, values in enumerate(rows)]
+
+
+class BatchRunner:
+    """
+    Answers the prompts of a batch of rows with ``generate`` on up to ``workers`` threads. Requests which fail in a way
+    which may pass are already retried by the LLM backend, so a row whose request fails is marked as failed.
+    """
+
+    def __init__(self, generate: Callable[[str], str], workers: int = 8):
+        self.generate = generate
+        self.workers = workers
+
+    def run(self, rows: list[BatchRow], template: str) -> Iterator[BatchRow]:
+        """
+        Runs the rows which are not done yet, yielding each row whenever its status changes. Rows are only changed
+        from the calling thread, so that it can show them as they are yielded. If the caller stops before the end,
+        the rows which were not answered are marked as cancelled, and the next run runs them again.
+        """
+        updates = queue.Queue()
+
+        def work(row: BatchRow, prompt: str):
+            updates.put((row, "running", None, None))
+            try:
+                updates.put((row, "done", self.generate(prompt), None))
+            except Exception as e:
+                updates.put((row, "failed", None, str(e) or type(e).__name__))
+
+        pending = [row for row in rows if row.status != "done"]
+        # The executor is not used as a context manager, which would keep the caller waiting for every row to finish
+        # when it stops early.
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch")
+        try:
+            finished = 0
+            for row in pending:
+                try:
+                    prompt = fill_template(template, row.values)
+                except ValueError as e:
+                    row.status, row.error = "failed", str(e)
+                    finished += 1
+                    yield row
+                    continue
+                row.status, row.error = "queued", None
+                row.attempts += 1
+                executor.submit(work, row, prompt)
+
+            while finished < len(pending):
+                row, status, output, error = updates.get()
+                row.status, row.output, row.error = status, output, error
+                if status in ("done", "failed"):
+                    finished += 1
+                yield row
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            for row in pending:
+                if row.status in ("queued", "running"):
+                    row.status = "cancelled"
+
+
+def export_csv(rows: Iterable[BatchRow]) -> Iterator[str]:
+    """Writes the rows and their outputs as CSV, one line at a time."""
+    rows = list(rows)
+    columns = list(dict.fromkeys(column for row in rows for column in row.as_dict()))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, columns)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row.as_dict())
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,50 @@
+import json
+from pathlib import Path
+
+import pytest
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-baseline",
+        action="store_true",
+        help="Record the measurements as the new baseline instead of comparing against it.",
+    )
+    parser.addoption(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="How much slower than the baseline (as a fraction) a measurement may be before it fails.",
+    )
+
+
+@pytest.fixture(scope="session")
+def baseline(request):
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    yield baseline
+    if request.config.getoption("--update-baseline"):
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+
+
+@pytest.fixture
+def check_baseline(request, baseline):
+    """Compares measurements against the stored baseline, or stores them with --update-baseline."""
+    tolerance = request.config.getoption("--tolerance")
+
+    def check(name: str, measurements: dict, slack: dict):
+        if request.config.getoption("--update-baseline") or name not in baseline:
+            baseline[name] = measurements
+            if not request.config.getoption("--update-baseline"):
+                pytest.skip(f"No baseline for {name}. Run with --update-baseline to record one.")
+            return
+
+        regressions = [
+            f"{key}: {value:.3f} (baseline {baseline[name][key]:.3f})"
+            for key, value in measurements.items()
+            if key in baseline[name] and value > baseline[name][key] * (1 + tolerance) + slack.get(key, 0)
+        ]
+        assert not regressions, f"{name} regressed: " + ", ".join(regressions)
+
+    return check
@@ -0,0 +1,223 @@
+"""
+Helpers to run the app headlessly with streamlit's AppTest, with Supabase stubbed out and the exercises answered by
+the fake LLM server.
+"""
+import functools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+from unittest import mock
+from urllib import parse
+
+# The settings need a Supabase project, but nothing here talks to it.
+os.environ.setdefault("SUPABASE_URL", "https://bench.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.bench")
+
+import streamlit
+import streamlit.testing.v1.app_test as app_test_module
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+from streamlit.testing.v1.util import patch_config_options
+from streamlit.util import calc_md5
+
+if TYPE_CHECKING:
+    from fake_llm_server import FakeLLMServer, LatencyProfile
+
+ROOT = Path(__file__).parent.parent
+
+# Streamlit internals
+#
+# AppTest cannot open a page of st.navigation, nor run a page returned by it, nor run at the same time as another
+# AppTest, so the benchmarks reach into streamlit's internals for these. Every such patch is made here, and only for
+# the streamlit versions they were checked against, so that an upgrade fails loudly instead of measuring blank pages.
+# After upgrading streamlit, check that the patches below still do what they say and add the version.
+STREAMLIT_VERSIONS = ("1.38",)
+
+
+def check_streamlit_version():
+    version = ".".join(streamlit.__version__.split(".")[:2])
+    if version not in STREAMLIT_VERSIONS:
+        raise RuntimeError(
+            f"The benchmarks patch internals of streamlit {', '.join(STREAMLIT_VERSIONS)}, but {streamlit.__version__} "
+            "is installed. Check the patches in bench/harness.py and add the version to STREAMLIT_VERSIONS."
+        )
+
+
+check_streamlit_version()
+
+# AppTest does not give its pages manager a script cache, so pages returned by st.navigation render nothing.
+app_test_module.PagesManager = functools.partial(PagesManager, script_cache=ScriptCache())
+
+
+def open_page(at: AppTest, page_path: str):
+    # st.navigation identifies pages by the hash of their url path, which is the file name without its extension.
+    # The home page is the default page, which has an empty url path. AppTest only sets the hash in its switch_page().
+    url_path = "" if page_path == "content/pages/Home.py" else Path(page_path).stem
+    at._page_hash = calc_md5(url_path)
+
+
+class ConcurrentAppTest(AppTest):
+    """
+    An AppTest which can run at the same time as others. AppTest installs a mock runtime for each run and removes it
+    afterwards, which breaks the other runs, so these share one installed by shared_runtime().
+
+    _run() is AppTest._run() of the versions in STREAMLIT_VERSIONS without installing the runtime, and without
+    replacing st.secrets, which is global.
+    """
+
+    def _run(self, widget_state=None, timeout: Optional[float] = None) -> AppTest:
+        if self.secrets:
+            raise RuntimeError("ConcurrentAppTest cannot run with secrets, as they are shared by every run")
+        if not isinstance(Runtime._instance, mock.MagicMock):
+            raise RuntimeError("ConcurrentAppTest runs inside shared_runtime()")
+
+        pages_manager = app_test_module.PagesManager(self._script_path, setup_watcher=False)
+        script_runner = LocalScriptRunner(
+            self._script_path, self.session_state, pages_manager, args=self.args, kwargs=self.kwargs
+        )
+        self._tree = script_runner.run(
+            widget_state, self.query_params, timeout or self.default_timeout, self._page_hash
+        )
+        self._tree._runner = self
+        # The last event is the shutdown, whose data includes the query string.
+        self.query_params = parse.parse_qs(script_runner.event_data[-1]["client_state"].query_string)
+        return self
+
+
+class shared_runtime:
+    """Installs one mock runtime for every ConcurrentAppTest, as AppTest does for each of its runs."""
+
+    def __enter__(self):
+        runtime = mock.MagicMock(spec=Runtime)
+        runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+        runtime.cache_storage_manager = MemoryCacheStorageManager()
+        Runtime._instance = runtime
+        self._config = patch_config_options({"global.appTest": True})
+        self._config.__enter__()
+        return runtime
+
+    def __exit__(self, *exc_info):
+        self._config.__exit__(*exc_info)
+        Runtime._instance = None
+
+
+def stub_services(profile: Optional["LatencyProfile"] = None) -> "FakeLLMServer":
+    """
+    Stubs out Supabase and points the exercise widgets at a fake LLM server. Returns the started server. The stubs
+    stay in place until the process exits.
+    """
+    import helpers
+    import llm
+    from fake_llm_server import FakeLLMServer, LatencyProfile
+    from openai_clients import ClientPool
+
+    mock.patch.object(helpers, "get_auth_client", mock.MagicMock()).start()
+
+    server = FakeLLMServer(profile=profile or LatencyProfile(ttft=0, tokens_per_second=1000)).start()
+    llm.set_backend(llm.OpenAIBackend("gpt-4o-mini", ClientPool(base_url=server.base_url)))
+    return server
+
+
+def app_test(page_path: Optional[str] = None, openai_key: Optional[str] = "sk-bench", timeout: float = 30) -> AppTest:
+    """Returns an AppTest of main.py which opens page_path (the home page by default) when it is run."""
+    at = AppTest.from_file(str(ROOT / "main.py"), default_timeout=timeout)
+    at.session_state["openai_key"] = openai_key
+    if page_path:
+        open_page(at, page_path)
+    return at
+
+
+def run(at: AppTest) -> float:
+    """Runs the app once and returns the wall time in seconds. Fails if the app raised an exception."""
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise AssertionError(f"The app raised an exception: {at.exception[0].message}")
+    return elapsed
+
+
+def measure_reruns(at: AppTest, reruns: int = 5) -> dict:
+    """
+    Runs the app once to warm up, then measures the median wall time of its reruns.
+    The peak memory is measured over one more rerun, as tracing memory slows the app down.
+    """
+    run(at)
+    times = [run(at) for _ in range(reruns)]
+
+    tracemalloc.start()
+    try:
+        run(at)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"rerun_seconds": round(statistics.median(times), 4), "peak_memory_kb": round(peak / 1024, 1)}
+
+
+def measure_submits(page_path: str, submits: int = 5) -> dict:
+    """
+    Measures the median wall time of the rerun which submits the first exercise on a page, including streaming the
+    answer from the fake LLM server. Each submit is made in a new session, with a prompt of its own so that the
+    response cache does not answer it.
+    """
+    times = []
+    for submit in range(submits):
+        at = app_test(page_path)
+        run(at)
+        prompt = next(text_area for text_area in at.text_area if text_area.label == "Prompt")
+        # Chats start empty, and ask for the prompt of their step.
+        prompt.set_value(f"{prompt.value or 'What is a will?'} (submit {submit + 1})")
+        next(button for button in at.button if button.label == "Submit").click()
+        times.append(run(at))
+    return {"submit_seconds": round(statistics.median(times), 4)}
+
+
+# Run in a fresh interpreter, so that nothing has been imported yet. Streamlit itself is imported first, as its
+# import time is not up to us.
+STARTUP_SCRIPT = """
+import json, sys, time
+import streamlit
+from bench.harness import app_test, run
+
+if sys.argv[1] == "import":
+    start = time.perf_counter()
+    import helpers, prompt_widget, routes
+    print(json.dumps(time.perf_counter() - start))
+else:
+    print(json.dumps(run(app_test())))
+"""
+
+
+def measure_startup(samples: int = 3) -> dict:
+    """
+    Measures the median time a new server process takes to import the app's modules, and to render the home page
+    for the first time (which includes those imports).
+    """
+    def sample(mode: str) -> float:
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT, mode],
+            cwd=ROOT,
+            env={**os.environ, "PYTHONPATH": str(ROOT)},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    return {
+        "import_seconds": round(statistics.median(sample("import") for _ in range(samples)), 4),
+        "first_render_seconds": round(statistics.median(sample("render") for _ in range(samples)), 4),
+    }
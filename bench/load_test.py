@@ -0,0 +1,275 @@
+"""
+Simulates learners using one instance of the app at the same time, to find out how many it can serve.
+
+Each learner is a session of main.py run by AppTest in its own thread, and the exercises are answered by the fake LLM
+server. Learners go through the course's pages in order, submit every exercise and move the History sliders back, with
+a unique prompt each time unless --default-prompts is given (so that the response cache does not answer for the LLM).
+This is repeated for each number of learners.
+
+    python -m bench.load_test --sessions 1 5 10 20 40
+    python -m bench.load_test --sessions 10 --ttft 0.5 --tokens-per-second 50 --json load.json
+
+For each number of learners, it reports the p50/p95/p99 wall time of reruns and of the time to first token (which
+includes waiting for the rate limiter), throughput in reruns a second, and memory per session. It also reports the
+number of learners after which throughput stops growing.
+"""
+import argparse
+import gc
+import json
+import math
+import threading
+import time
+import tracemalloc
+from typing import Optional
+from unittest import mock
+
+from bench.harness import ROOT, ConcurrentAppTest, open_page, shared_runtime, stub_services
+
+SUBMIT_LABELS = ("Submit", "Submit all")
+
+
+def record_first_tokens(samples: list[float]):
+    """
+    Patches the exercise widgets to record the seconds from asking for a completion to its first token, which
+    includes waiting for the rate limiter and cache hits.
+    """
+    import prompt_widget
+
+    stream_chat_completion = prompt_widget.stream_chat_completion
+
+    def timed_stream_chat_completion(*args, **kwargs):
+        start = time.perf_counter()
+        first = True
+        for text in stream_chat_completion(*args, **kwargs):
+            if first:
+                samples.append(time.perf_counter() - start)
+                first = False
+            yield text
+
+    return mock.patch.object(prompt_widget, "stream_chat_completion", timed_stream_chat_completion)
+
+
+class Learner:
+    """One simulated learner, going through the pages of the course in a session of its own."""
+
+    def __init__(self, number: int, unique_prompts: bool = True, submits: int = 2, think_time: float = 0):
+        self.number = number
+        self.unique_prompts = unique_prompts
+        self.submits = submits
+        self.think_time = think_time
+        self.at = ConcurrentAppTest(str(ROOT / "main.py"), default_timeout=120)
+        # Each learner brings their own key, so the per-key rate limits apply to each of them.
+        self.at.session_state["openai_key"] = f"sk-load-{number}"
+        self.rerun_seconds: list[float] = []
+        self.errors: list[str] = []
+
+    def rerun(self):
+        if self.think_time:
+            time.sleep(self.think_time)
+        start = time.perf_counter()
+        try:
+            self.at.run()
+        except Exception as e:
+            self.errors.append(repr(e))
+            return
+        self.rerun_seconds.append(time.perf_counter() - start)
+        if self.at.exception:
+            self.errors.append(self.at.exception[0].message)
+        # The exercises show the LLM being unavailable, e.g. a queue timeout, as an error instead of raising.
+        self.errors.extend(error.value for error in self.at.error)
+
+    def fill_prompts(self, attempt: int):
+        suffix = f" (learner {self.number}, attempt {attempt + 1})"
+        for text_area in self.at.text_area:
+            if text_area.label == "Prompt" and not text_area.value:
+                # Chats start empty, and ask for the prompt of their step.
+                text_area.set_value("What is a will?" + (suffix if self.unique_prompts else ""))
+            elif text_area.label == "Prompt" and self.unique_prompts:
+                text_area.set_value(text_area.value + suffix)
+        for text_input in self.at.text_input:
+            if text_input.label == "Template" and self.unique_prompts:
+                text_input.set_value(text_input.value + suffix)
+
+    def visit(self, page_path: str):
+        """
+        Opens a page, submits each exercise and moves the History sliders back. An action which cannot be made, e.g.
+        because a submit failed and left no slider to move, is recorded as an error so that no rerun goes missing.
+        """
+        open_page(self.at, page_path)
+        self.rerun()
+
+        forms = sum(button.label in SUBMIT_LABELS for button in self.at.button)
+        for index in range(forms):
+            for attempt in range(self.submits):
+                self.fill_prompts(attempt)
+                buttons = [button for button in self.at.button if button.label in SUBMIT_LABELS]
+                if index >= len(buttons):
+                    self.errors.append(f"{page_path}: submit button {index + 1} of {forms} is gone")
+                    continue
+                buttons[index].click()
+                self.rerun()
+
+        for index in range(len(self.at.slider)):
+            slider = self.at.slider[index]
+            if slider.label != "History":
+                continue
+            if slider.value == slider.min:
+                # The slider shows the latest run after a submit.
+                self.errors.append(f"{page_path}: History slider {index + 1} is already at the first run")
+                continue
+            slider.set_value(slider.min)
+            self.rerun()
+
+    def run(self, pages: list[str]):
+        for page_path in pages:
+            self.visit(page_path)
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    """The q-th percentile (0-100) of values, by the nearest rank."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(values: list[float]) -> dict:
+    return {f"p{q}": round(percentile(values, q), 4) if values else None for q in (50, 95, 99)}
+
+
+def run_level(sessions: int, pages: list[str], **learner_options) -> dict:
+    """Runs a number of learners at the same time, and measures them."""
+    first_tokens: list[float] = []
+    learners = [Learner(number, **learner_options) for number in range(sessions)]
+    start_line = threading.Barrier(sessions)
+
+    def run(learner: Learner):
+        start_line.wait()
+        learner.run(pages)
+
+    with record_first_tokens(first_tokens):
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=run, args=(learner,), name=f"learner-{learner.number}") for learner in learners
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+    rerun_seconds = [seconds for learner in learners for seconds in learner.rerun_seconds]
+    errors = [error for learner in learners for error in learner.errors]
+    return {
+        "sessions": sessions,
+        "reruns": len(rerun_seconds),
+        "errors": len(errors),
+        "first_errors": errors[:3],
+        "seconds": round(elapsed, 2),
+        "reruns_per_second": round(len(rerun_seconds) / elapsed, 2),
+        "rerun_seconds": summarize(rerun_seconds),
+        "first_token_seconds": summarize(first_tokens),
+    }
+
+
+def measure_session_memory(pages: list[str], sessions: int = 3, **learner_options) -> float:
+    """
+    The memory in KiB that a session keeps after going through the pages, on average. Measured apart from the load,
+    one learner after another, as tracing memory slows the app down. One more learner goes through the pages first,
+    so that the caches shared by every session (imported modules, cached resources and the like) are not counted.
+    """
+    Learner(sessions, **learner_options).run(pages)
+    learners = [Learner(number, **learner_options) for number in range(sessions)]
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for learner in learners:
+            learner.run(pages)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round((after - before) / sessions / 1024, 1)
+
+
+def saturation_point(levels: list[dict], min_gain: float = 0.1) -> Optional[int]:
+    """
+    The number of learners after which more learners did not raise throughput by at least min_gain (a fraction),
+    or None if throughput kept growing up to the last level.
+    """
+    for previous, level in zip(levels, levels[1:]):
+        if level["reruns_per_second"] < previous["reruns_per_second"] * (1 + min_gain):
+            return previous["sessions"]
+    return None
+
+
+def format_report(levels: list[dict], memory_kb: float, saturation: Optional[int]) -> str:
+    def cell(value):
+        return "-" if value is None else f"{value:.3f}"
+
+    lines = [
+        f"{'learners':>8} {'reruns':>6} {'errors':>6} {'reruns/s':>8}  "
+        f"{'rerun p50':>9} {'p95':>7} {'p99':>7}  {'ttft p50':>8} {'p95':>7} {'p99':>7}"
+    ]
+    for level in levels:
+        rerun, ttft = level["rerun_seconds"], level["first_token_seconds"]
+        lines.append(
+            f"{level['sessions']:>8} {level['reruns']:>6} {level['errors']:>6} {level['reruns_per_second']:>8.2f}  "
+            f"{cell(rerun['p50']):>9} {cell(rerun['p95']):>7} {cell(rerun['p99']):>7}  "
+            f"{cell(ttft['p50']):>8} {cell(ttft['p95']):>7} {cell(ttft['p99']):>7}"
+        )
+    lines.append(f"Memory per session: {memory_kb} KiB")
+    if saturation is None:
+        lines.append("Throughput kept growing up to the most learners tested.")
+    else:
+        lines.append(f"Throughput stops growing after {saturation} learners.")
+    for level in levels:
+        for error in level["first_errors"]:
+            lines.append(f"Error with {level['sessions']} learners: {error}")
+    return "\n".join(lines)
+
+
+def main():
+    from fake_llm_server import LatencyProfile
+    from routes import route_registry
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 20], help="Numbers of learners to run")
+    parser.add_argument("--pages", nargs="+", help="Page paths to go through, instead of every active page")
+    parser.add_argument("--submits", type=int, default=2, help="Times each exercise is submitted")
+    parser.add_argument("--think-time", type=float, default=0, help="Seconds a learner waits before each action")
+    parser.add_argument("--default-prompts", action="store_true", help="Submit the exercises' prompts unchanged")
+    parser.add_argument("--json", help="Also write the results to this file")
+    for name, field in LatencyProfile.model_fields.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=field.annotation, default=field.default,
+                            help=f"Fake LLM: {field.description}")
+    args = parser.parse_args()
+
+    pages = args.pages or [page.path for page in route_registry.pages if page.active]
+    learner_options = {
+        "unique_prompts": not args.default_prompts,
+        "submits": args.submits,
+        "think_time": args.think_time,
+    }
+    server = stub_services(LatencyProfile(**{name: getattr(args, name) for name in LatencyProfile.model_fields}))
+    try:
+        with shared_runtime():
+            levels = []
+            for sessions in sorted(args.sessions):
+                levels.append(run_level(sessions, pages, **learner_options))
+                print(f"{sessions} learners: {levels[-1]['reruns_per_second']} reruns/s", flush=True)
+            memory_kb = measure_session_memory(pages, **learner_options)
+    finally:
+        server.stop()
+
+    saturation = saturation_point(levels)
+    print(format_report(levels, memory_kb, saturation))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            results = {"levels": levels, "memory_per_session_kb": memory_kb, "saturation_sessions": saturation}
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Checks that the load test can run learners at the same time. Run the load test itself with python -m bench.load_test.
+"""
+import pytest
+
+from bench.harness import ROOT, ConcurrentAppTest, shared_runtime, stub_services
+from bench.load_test import percentile, run_level, saturation_point
+from fake_llm_server import LatencyProfile
+
+
+@pytest.fixture(scope="module", autouse=True)
+def services():
+    server = stub_services(LatencyProfile(ttft=0.05, tokens_per_second=500, tokens=10))
+    yield server
+    server.stop()
+
+
+def test_learners_run_at_the_same_time():
+    with shared_runtime():
+        level = run_level(3, ["content/pages/completion.py", "content/pages/chat_as_memory.py"], submits=1)
+
+    assert level["errors"] == 0, level["first_errors"]
+    # Opening each page, submitting each exercise and moving the History slider of the completion back: its three
+    # samples make three runs, while the chats have one run each and no slider. Actions which cannot be made are errors.
+    assert level["reruns"] == 3 * 6
+    assert level["first_token_seconds"]["p50"] is not None
+
+
+def test_concurrent_app_test_needs_the_shared_runtime():
+    with pytest.raises(RuntimeError, match="shared_runtime"):
+        ConcurrentAppTest(str(ROOT / "main.py"), default_timeout=10).run()
+
+
+def test_percentile_and_saturation_point():
+    assert percentile(list(range(1, 101)), 95) == 95
+    assert percentile([0.5], 99) == 0.5
+
+    levels = [
+        {"sessions": 1, "reruns_per_second": 4},
+        {"sessions": 5, "reruns_per_second": 15},
+        {"sessions": 10, "reruns_per_second": 15.5},
+    ]
+    assert saturation_point(levels) == 5
+    assert saturation_point(levels[:2]) is None
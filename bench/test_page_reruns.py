@@ -0,0 +1,36 @@
+"""
+Measures how long a rerun of main.py takes on every page of the course, and how much memory it uses, and how long
+submitting an exercise takes.
+
+    python -m pytest bench                     # compare against bench/baseline.json
+    python -m pytest bench --update-baseline   # record a new baseline
+"""
+import pytest
+
+from bench.harness import app_test, measure_reruns, measure_submits, stub_services
+from routes import get_routes_list
+
+# Small absolute allowances, so that noise on very fast pages does not fail the benchmark.
+SLACK = {"rerun_seconds": 0.02, "peak_memory_kb": 256, "submit_seconds": 0.05}
+
+# A page with a prompt exercise and one with a chat exercise.
+EXERCISE_PAGES = ["content/pages/completion.py", "content/pages/chat_as_memory.py"]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def services():
+    server = stub_services()
+    yield server
+    server.stop()
+
+
+@pytest.mark.parametrize("page_path", [page.path for page in get_routes_list() if page.active])
+def test_page_rerun(page_path, check_baseline):
+    measurements = measure_reruns(app_test(page_path))
+    check_baseline(page_path, measurements, SLACK)
+
+
+@pytest.mark.parametrize("page_path", EXERCISE_PAGES)
+def test_submit_exercise(page_path, check_baseline):
+    measurements = measure_submits(page_path)
+    check_baseline(f"{page_path} submit", measurements, SLACK)
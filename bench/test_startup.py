@@ -0,0 +1,23 @@
+"""
+Measures how long a new server process takes before it can serve its first page. This is what a learner waits for
+when an instance has just been started.
+
+    python -m pytest bench/test_startup.py
+"""
+from bench.harness import measure_startup
+
+# Fails regardless of the baseline if startup goes over these, in seconds.
+BUDGET = {"import_seconds": 1.0, "first_render_seconds": 2.0}
+
+SLACK = {"import_seconds": 0.05, "first_render_seconds": 0.1}
+
+
+def test_startup(check_baseline):
+    measurements = measure_startup()
+
+    over_budget = [
+        f"{key}: {value:.3f} (budget {BUDGET[key]:.3f})" for key, value in measurements.items() if value > BUDGET[key]
+    ]
+    assert not over_budget, "Startup is over budget: " + ", ".join(over_budget)
+
+    check_baseline("startup", measurements, SLACK)
@@ -1,9 +1,9 @@
 import streamlit as st
 
-from helpers import supabase_client
+from helpers import get_auth_client, write_image
 from routes import get_navigation
 
-st.image("content/reading_bar.png", use_column_width=True)
+write_image("content/reading_bar.png", alt="Prompt Engineering for Lawyers")
 
 st.title("Prompt Engineering for Lawyers")
 
@@ -27,7 +27,7 @@ else:
             from gotrue.errors import AuthApiError
 
             try:
-                supabase_client.auth.sign_in_with_otp(
+                get_auth_client().sign_in_with_otp(
                     {
                         "email": email,
                         "options": {
@@ -45,7 +45,7 @@ We will make one change to it. Can you find it?
 """
 
 exercise = "Welcome our new overlords - the System Role"
-chat_prompt(exercise, history=[
+chat_prompt(exercise, exercise_id="a_role_for_the_system/system_role", history=[
     {"role": "system", "content": 'You are an expert note taker for a mediation. Say "OK" to all my notes '
                                   'until the mediation is over. '
                                  'Then produce a narrative summary of the mediation'},
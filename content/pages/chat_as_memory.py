@@ -48,7 +48,7 @@ Try entering it. You will notice that after you submit your response, the chat w
 step to take. Following this allows you to complete the exercise, even though you are not compelled to do so.
 """
 
-chat_prompt(exercise_3, history=[
+chat_prompt(exercise_3, exercise_id="chat_as_memory/who_is_bob", history=[
     {"role": "assistant", "content": "I'm Bob, an innovative lawyer here to help you understand LLMs."}
 ], steps=[
     "Glad to meet you. What can you tell me about LLMs in 20 words or less?",
@@ -84,7 +84,7 @@ However, when combined with a large language model, you can find new and surpris
 """
 
 exercise_4 = "The fly on the wall during a mediation"
-chat_prompt(exercise_4, history=[
+chat_prompt(exercise_4, exercise_id="chat_as_memory/mediation_notes", history=[
     {"role": "user", "content": 'I am a lawyer and I am taking down notes by telling you what is going on during '
                                  'my mediation. Say "OK" to all my notes until the mediation is over. '
                                  'Do you understand?.'},
@@ -41,13 +41,16 @@ st.header("Let's Throw Something at a LLM", divider=True)
 Let's ask the LLM a simple question. In the exercise area below, I have already provided the prompt to try. 
 """
 
-simple_prompt("Let's Throw Something at a LLM", default_text="What is will in ten words or less?")
+# This exercise is about randomness, so responses are never served from the cache,
+# and three responses are generated side by side for every submit.
+simple_prompt("Let's Throw Something at a LLM", exercise_id="completion/throw_something",
+              default_text="What is will in ten words or less?", cache=False, samples=3)
 
 """
 
-1. Click submit and wait for the LLM to give a response.
+1. Click submit and wait for the LLM to give a response. The LLM is asked three times, side by side.
 
-2. Now, ask the LLM again. Did you get the same response? 
+2. Did you get the same response each time? Now, ask the LLM again. Did you get the same responses? 
 
 3. Assume you were aiming for the meaning of will as a testamentary disposition. 
 Did you get that meaning? Even after several tries?
@@ -3,7 +3,7 @@ import streamlit as st
 # A page template to keep track of all the helper functions and classes that are used in the project.
 # Make a copy of this page to begin a new page
 from helpers import navigation_footer, check_openai_key, write_what_you_will_learn
-from prompt_widget import simple_prompt
+from prompt_widget import matrix_prompt, simple_prompt
 
 # Page path is used to identify the page in the navigation footer. Use the file path to the page.
 PAGE_PATH = "content/pages/everything_in_context.py"
@@ -70,7 +70,8 @@ We are going to use the prompt we introduced earlier and modify the context in v
 output. So follow along! Remember to use the history slider to see the changes in the output.
 """
 
-simple_prompt("Everything in its right context", default_text="I am at my lawyer's office. What is will?")
+simple_prompt("Everything in its right context", exercise_id="everything_in_context/right_context",
+              default_text="I am at my lawyer's office. What is will?")
 
 """
 1. Prompt "I am at my lawyer's office. What is will?": This is the original prompt. You will probably get a law-
@@ -93,8 +94,23 @@ request, but the LLM is still able to output meaningful content. I am not as con
 there would be few changes in meaning of the word within 3000 years.  
 
 Remember to try your own prompts. Do you get the output you were expecting? 
+
+Instead of trying the prompts one at a time, you can also send them all at once and compare the answers side by side.
+Change the contexts below, or add your own on a new line.
 """
 
+matrix_prompt(
+    "Everything in its right context, side by side",
+    template="{context} What is will?",
+    values=[
+        "I am at my lawyer's office.",
+        "I am outside a law firm.",
+        "I am at a party.",
+        "I am at a party with several geriatrics.",
+        "It's the year 6123.",
+    ],
+)
+
 st.header("Conclusion", divider=True)
 
 """
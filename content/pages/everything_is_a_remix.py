@@ -3,7 +3,7 @@ import streamlit as st
 # A page template to keep track of all the helper functions and classes that are used in the project.
 # Make a copy of this page to begin a new page
 from helpers import navigation_footer, check_openai_key, write_what_you_will_learn
-from prompt_widget import simple_prompt
+from prompt_widget import batch_prompt, simple_prompt
 
 # Page path is used to identify the page in the navigation footer. Use the file path to the page.
 PAGE_PATH = "content/pages/everything_is_a_remix.py"
@@ -34,7 +34,7 @@ I've borrowed a confidentiality clause. It's not the most complicated contract c
 improvement. Let's see what the LLM can help us with.
 """
 
-simple_prompt(exercise_2,
+simple_prompt(exercise_2, exercise_id="everything_is_a_remix/contract_clause",
               default_text="Rewrite this confidentiality clause to be more simple and plain: \n "
                            "The Tenant hereby declare and warrant that the Tenant shall at any time be obliged to keep confidential "
                            "all the information obtained including but not limited to the terms of this Tenancy Agreement, "
@@ -51,5 +51,20 @@ simple_prompt(exercise_2,
 
 "Do you agree that the output is easier to read now?"
 
+exercise_3 = "Remix a whole contract"
+st.header(exercise_3)
+
+"""
+Once you have a prompt which works for one clause, you can use it on many clauses at once.
+
+Upload a CSV file (with a header row) or a JSONL file (with one object on each line) of clauses, and write a prompt
+template. Put the name of a column in braces, like `{clause}`, and it will be filled in from each row.
+Several rows are answered at the same time, and the table fills in as they finish. When it is done, you can download
+the results to check them in a spreadsheet.
+"""
+
+batch_prompt(exercise_3,
+             default_template="Rewrite this contract clause to be more simple and plain: \n{clause}")
+
 # Navigation footer is a common footer that is used in all pages. It provides links to the previous and next pages.
 navigation_footer(PAGE_PATH)
@@ -48,7 +48,8 @@ They might be too tired to write an email that sounds professional.
 Here a LLM can "correct" the tone of the email to be more professional.
 """
 
-simple_prompt(exercise_1, default_text="I am a lawyer writing an email to my client. This is my email: "
+simple_prompt(exercise_1, exercise_id="now_this/email_tone",
+              default_text="I am a lawyer writing an email to my client. This is my email: "
               "Hey I just wanted to tell you that I went to court today and man the wait was so long. "
               "When I finally got to speak to the Judge, he was like are you all ready for trial? "
               "I told him you still had to make a few more discovery application, "
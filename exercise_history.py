@@ -0,0 +1,69 @@
+import collections
+import datetime
+import sys
+import time
+from typing import Iterator, Optional
+
+
+class SimplePromptHistoryItem:
+    """
+    One attempt at a simple prompt exercise.
+
+    Prompts are interned, so learners who submit the same prompt (usually the exercise's default text) share
+    one copy of it, and the date is kept as a timestamp.
+    """
+
+    __slots__ = ("user", "assistant", "timestamp")
+
+    def __init__(self, user: str, assistant: Optional[str] = None, timestamp: Optional[float] = None):
+        self.user = sys.intern(user)
+        self.assistant = assistant
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def as_dict(self) -> dict:
+        return {"user": self.user, "assistant": self.assistant, "timestamp": self.timestamp}
+
+    @property
+    def date(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.timestamp)
+
+    def __repr__(self):
+        return f"SimplePromptHistoryItem(user={self.user!r}, assistant={self.assistant!r}, date={self.date})"
+
+
+class ExerciseHistory:
+    """
+    The attempts at an exercise, oldest first. Once it holds ``max_items`` attempts, adding another drops the oldest,
+    so that the memory used by each learner is bounded.
+    """
+
+    __slots__ = ("_items",)
+
+    def __init__(self, max_items: int = 50):
+        self._items: collections.deque[SimplePromptHistoryItem] = collections.deque(maxlen=max_items)
+
+    @property
+    def max_items(self) -> int:
+        return self._items.maxlen
+
+    def append(self, item: SimplePromptHistoryItem):
+        self._items.append(item)
+
+    def remove(self, item: SimplePromptHistoryItem):
+        """Removes an attempt, unless it was already dropped as one of the oldest."""
+        for index, held in enumerate(self._items):
+            if held is item:
+                del self._items[index]
+                return
+
+    def __getitem__(self, index: int) -> SimplePromptHistoryItem:
+        return self._items[index]
+
+    def __setitem__(self, index: int, item: SimplePromptHistoryItem):
+        self._items[index] = item
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[SimplePromptHistoryItem]:
+        return iter(self._items)
@@ -0,0 +1,192 @@
+"""
+A local stand-in for the OpenAI chat completions API, for running and benchmarking the app without OpenAI.
+
+It streams a canned answer with a configurable time to first token and token rate, and can inject errors and
+rate limits. Run it and point the app at it:
+
+    python fake_llm_server.py --port 8001 --ttft 0.6 --tokens-per-second 40 --rate-limit-rate 0.05
+    LLM_BASE_URL=http://127.0.0.1:8001/v1 streamlit run main.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from token_budget import count_message_tokens
+
+ANSWER = (
+    "A will is a legal document in which a person, the testator, sets out how their property is to be "
+    "distributed after their death and appoints an executor to carry out those wishes. It must usually be "
+    "in writing, signed by the testator and witnessed by two people who are not beneficiaries. "
+)
+
+
+class LatencyProfile(BaseModel):
+    ttft: float = Field(default=0.5, description="Seconds before the first token is sent")
+    tokens_per_second: float = Field(default=50, description="Rate at which tokens are streamed after the first")
+    tokens: int = Field(default=60, description="Number of tokens in an answer, unless max_tokens is lower")
+    error_rate: float = Field(default=0, description="Fraction of requests which fail with a 500 error")
+    rate_limit_rate: float = Field(default=0, description="Fraction of requests which fail with a 429 error")
+
+
+def answer_tokens(count: int) -> list[str]:
+    words = ANSWER.split()
+    return [words[index % len(words)] + " " for index in range(count)]
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeLLMServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: dict, headers: Optional[dict] = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_chunk(self, data: str):
+        encoded = data.encode("utf-8")
+        self.wfile.write(f"{len(encoded):x}\r\n".encode("ascii") + encoded + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        model = {"id": self.server.model, "object": "model", "created": 0, "owned_by": "fake"}
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [model]})
+        elif "/models/" in self.path:
+            self.send_json(200, {**model, "id": self.path.rstrip("/").rsplit("/", 1)[-1]})
+        else:
+            self.send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+
+        profile = self.server.profile
+        if random.random() < profile.rate_limit_rate:
+            self.send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"Retry-After": "1"},
+            )
+            return
+        if random.random() < profile.error_rate:
+            self.send_json(500, {"error": {"message": "The server had an error", "type": "server_error"}})
+            return
+
+        tokens = answer_tokens(min(profile.tokens, request.get("max_tokens") or profile.tokens))
+        usage = {
+            "prompt_tokens": count_message_tokens(request.get("messages", [])),
+            "completion_tokens": len(tokens),
+            "total_tokens": count_message_tokens(request.get("messages", [])) + len(tokens),
+        }
+        completion = {
+            "id": f"chatcmpl-fake-{random.getrandbits(32):x}",
+            "created": int(time.time()),
+            "model": request.get("model", self.server.model),
+        }
+
+        time.sleep(profile.ttft)
+
+        if not request.get("stream"):
+            time.sleep(len(tokens) / profile.tokens_per_second)
+            self.send_json(200, {
+                **completion,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices, **extra):
+            self.send_chunk(
+                "data: " + json.dumps({**completion, "object": "chat.completion.chunk", "choices": choices, **extra})
+                + "\n\n"
+            )
+
+        try:
+            for index, token in enumerate(tokens):
+                if index:
+                    time.sleep(1 / profile.tokens_per_second)
+                delta = {"role": "assistant", "content": token} if index == 0 else {"content": token}
+                event([{"index": 0, "delta": delta, "finish_reason": None}])
+
+            event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (request.get("stream_options") or {}).get("include_usage"):
+                event([], usage=usage)
+
+            self.send_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading, e.g. because a hedged request answered first.
+            self.close_connection = True
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, profile: Optional[LatencyProfile] = None,
+                 model: str = "gpt-4o-mini"):
+        super().__init__((host, port), FakeLLMHandler)
+        self.profile = profile or LatencyProfile()
+        self.model = model
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        """Serves requests from a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--model", default="gpt-4o-mini")
+    for name, field in LatencyProfile.model_fields.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=field.annotation, default=field.default,
+                            help=field.description)
+    args = parser.parse_args()
+
+    profile = LatencyProfile(**{name: getattr(args, name) for name in LatencyProfile.model_fields})
+    server = FakeLLMServer(args.host, args.port, profile, args.model)
+    print(f"Serving a fake chat completions API at {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,25 @@
-from typing import Optional
+import functools
+from contextlib import suppress
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from streamlit_url_fragments import get_fragments
-from supabase import create_client
 
+from auth_tokens import AuthClients, AuthSession, ExpiredToken, InvalidToken, RefreshScheduler, TokenVerifier
 from settings import settings
 
 
 def use_custom_css():
-    with open("custom.css") as custom_css:
-        return st.write(f'<style>{custom_css.read()}</style>', unsafe_allow_html=True)
+    from assets import custom_css
+
+    return st.write(f'<style>{custom_css()}</style>', unsafe_allow_html=True)
+
+
+def write_image(path: str, alt: str = ""):
+    """Shows an image across the page, served as optimised WebP copies."""
+    from assets import image_html
+
+    st.html(image_html(path, alt))
 
 
 def check_openai_key():
@@ -24,19 +34,56 @@ def check_openai_key():
             submitted = st.form_submit_button("Submit")
 
             if submitted:
-                from openai import AuthenticationError
-                try:
-                    import openai
-                    client = openai.Client(api_key=st.session_state.openai_key_input)
-                    client.models.list()
-                except AuthenticationError:
-                    st.error(
-                        "An incorrect API Key was provided. You can find your API key at "
-                        "https://platform.openai.com/account/api-keys."
-                    )
-                    return
-                st.session_state["openai_key"] = st.session_state.openai_key_input
-                st.success("Success! You are good to go.", icon="🎉")
+                # The key is checked in the background, unless it was checked recently.
+                from key_validation import key_validator
+                api_key = st.session_state.openai_key_input
+                st.session_state["openai_key_validation"] = (api_key, key_validator.validate(api_key))
+
+        if "openai_key_validation" in st.session_state:
+            resolve_openai_key_validation()
+
+
+def resolve_openai_key_validation():
+    api_key, validation = st.session_state["openai_key_validation"]
+
+    if not validation.done():
+        wait_for_openai_key_validation()
+        return
+
+    del st.session_state["openai_key_validation"]
+
+    from llm import ModelUnavailable
+
+    try:
+        valid = validation.result()
+    except ModelUnavailable as e:
+        st.error(
+            f"Your API key works, but it cannot use {e.model}, which the exercises need. Check the model's access "
+            "and your project's limits at https://platform.openai.com/settings."
+        )
+        return
+    except Exception as e:
+        st.error(f"Your API key could not be checked. Please try again later. ({e})")
+        return
+
+    if not valid:
+        st.error(
+            "An incorrect API Key was provided. You can find your API key at "
+            "https://platform.openai.com/account/api-keys."
+        )
+        return
+
+    st.session_state["openai_key"] = api_key
+    st.success("Success! You are good to go.", icon="🎉")
+
+
+@st.fragment(run_every=0.5)
+def wait_for_openai_key_validation():
+    """Shows that the key is being checked, and reruns the page once the check is done."""
+    _, validation = st.session_state["openai_key_validation"]
+    if validation.done():
+        st.rerun()
+    st.info("Checking your API key...", icon="⏳")
 
 
 def write_footer():
@@ -75,7 +122,86 @@ def write_more_resources(resources: list[str]):
 """)
 
 
-supabase_client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
+# The Supabase auth clients are created on first use, as importing them is slow and most reruns do not need them.
+@functools.cache
+def get_auth_http_client():
+    import httpx
+    from gotrue.http_clients import SyncClient
+
+    return SyncClient(
+        follow_redirects=True,
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=settings.SUPABASE_AUTH_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SUPABASE_AUTH_MAX_CONNECTIONS,
+        ),
+    )
+
+
+def create_auth_client(session_id: str):
+    from gotrue import SyncGoTrueClient
+
+    return SyncGoTrueClient(
+        url=f"{settings.SUPABASE_URL}/auth/v1",
+        headers={"apiKey": settings.SUPABASE_KEY, "Authorization": f"Bearer {settings.SUPABASE_KEY}"},
+        auto_refresh_token=False,
+        persist_session=False,
+        http_client=get_auth_http_client(),
+    )
+
+
+# Every session logs in and out with its own auth client, so that sessions do not overwrite each other's login.
+# The clients share one HTTP client, so that they reuse its connections to Supabase.
+auth_clients = AuthClients(
+    create_auth_client,
+    max_clients=settings.SUPABASE_AUTH_POOL_MAX_CLIENTS,
+    idle_timeout=settings.SUPABASE_AUTH_POOL_IDLE_TIMEOUT,
+)
+
+
+def get_auth_client():
+    """Returns the Supabase auth client of the current session."""
+    return auth_clients.get(get_script_run_ctx().session_id)
+
+
+token_verifier = TokenVerifier(settings.SUPABASE_JWT_SECRET)
+token_refresher = RefreshScheduler(margin=settings.SUPABASE_TOKEN_REFRESH_MARGIN)
+
+
+def start_auth_session(access_token: str, refresh_token: str) -> AuthSession:
+    """
+    Checks the tokens from a magic link, locally if possible and otherwise with Supabase, and keeps them refreshed
+    while the session is in use. Raises if the tokens are not valid.
+    """
+    auth_client = get_auth_client()
+
+    try:
+        claims = token_verifier.verify(access_token)
+    except ExpiredToken:
+        # Supabase swaps an expired access token for a new one if the refresh token is still good.
+        claims = None
+
+    if claims is not None:
+        auth_session = AuthSession(access_token, refresh_token, claims["exp"], claims.get("sub"))
+    else:
+        session = auth_client.set_session(access_token, refresh_token).session
+        if session is None or session.expires_at is None:
+            raise InvalidToken("Supabase did not accept the login")
+        auth_session = AuthSession(
+            session.access_token, session.refresh_token, session.expires_at, session.user.id if session.user else None
+        )
+
+    def refresh():
+        if auth_session.idle() > settings.SUPABASE_AUTH_POOL_IDLE_TIMEOUT:
+            return None
+        session = auth_client.refresh_session(auth_session.refresh_token).session
+        auth_session.access_token = session.access_token
+        auth_session.refresh_token = session.refresh_token
+        auth_session.expires_at = session.expires_at
+        return session.expires_at
+
+    token_refresher.schedule(get_script_run_ctx().session_id, auth_session.expires_at, refresh)
+    return auth_session
 
 
 def is_supabase_session_params(obj: dict):
@@ -103,17 +229,34 @@ def welcome_mat():
         if session_params:
             if is_supabase_session_params(session_params):
                 try:
-                    supabase_client.auth.set_session(session_params["access_token"], session_params["refresh_token"])
-                    supabase_client.auth.get_user()
+                    st.session_state["auth_session"] = start_auth_session(
+                        session_params["access_token"], session_params["refresh_token"]
+                    )
+                    st.session_state["logged_in"] = True
                 except Exception as e:
                     st.error(f"An error occurred: {e}")
-                st.session_state["logged_in"] = True
+                    st.session_state["logged_in"] = False
         else:
             st.session_state["logged_in"] = False
+    elif "auth_session" in st.session_state:
+        # The tokens are refreshed in the background, so they only expire if refreshing failed.
+        auth_session: AuthSession = st.session_state["auth_session"]
+        auth_session.touch()
+        if auth_session.expired:
+            del st.session_state["auth_session"]
+            st.session_state["logged_in"] = False
 
 
 def log_out():
-    supabase_client.auth.sign_out()
+    from gotrue.errors import AuthApiError
+
+    session_id = get_script_run_ctx().session_id
+    token_refresher.cancel(session_id)
+    auth_session = st.session_state.pop("auth_session", None)
+    if auth_session is not None:
+        with suppress(AuthApiError):
+            get_auth_client().admin.sign_out(auth_session.access_token)
+    auth_clients.remove(session_id)
     st.session_state["logged_in"] = False
     st.session_state["openai_key"] = None
     st.query_params.clear()
@@ -123,38 +266,18 @@ def navigation_footer(page_path: str):
 
     st.divider()
 
-    from routes import get_routes_list
-    routes = get_routes_list()
-
-    def search_route_index_by_path(path: str) -> (int, Optional[st.Page]):
-        for index, page in enumerate(routes):
-            if page.path == path:
-                return index, page
-        return -1, None
-
-    page_index, page_page = search_route_index_by_path(page_path)
-    if page_index > 0:
-        if page_index == len(routes) - 1:
-            col1, col2 = st.columns(2)
-            with col1:
-                previous_page = routes[page_index - 1]
-                st.page_link(f"{previous_page.path}", label=f"_{previous_page.title}_", icon="⬅️")
-            with col2:
-                st.page_link("content/pages/Home.py", label="Home", icon="🏠")
-        else:
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                previous_page = routes[page_index - 1]
-                st.page_link(f"{previous_page.path}", label=f"_{previous_page.title}_", icon="⬅️")
-            with col2:
-                st.page_link("content/pages/Home.py", label="Home", icon="🏠")
-            with col3:
-                next_page = routes[page_index + 1]
-                st.page_link(f"{next_page.path}", label=f"_{next_page.title}_", icon="➡️")
-    elif page_index == 0:
-        col1, col2 = st.columns(2)
-        with col1:
-            st.page_link("content/pages/Home.py", label="Home", icon="🏠")
-        with col2:
-            next_page = routes[page_index + 1]
-            st.page_link(f"{next_page.path}", label=f"_{next_page.title}_", icon="➡️")
\ No newline at end of file
+    from routes import route_registry
+
+    if page_path not in route_registry.links:
+        return
+
+    previous_page, next_page = route_registry.links[page_path]
+    columns = iter(st.columns(2 if previous_page is None or next_page is None else 3))
+    if previous_page is not None:
+        with next(columns):
+            st.page_link(f"{previous_page.path}", label=f"_{previous_page.title}_", icon="⬅️")
+    with next(columns):
+        st.page_link("content/pages/Home.py", label="Home", icon="🏠")
+    if next_page is not None:
+        with next(columns):
+            st.page_link(f"{next_page.path}", label=f"_{next_page.title}_", icon="➡️")
@@ -0,0 +1,226 @@
+"""
+Keeps learners' exercise history across sessions and devices, in Supabase or, in development, a SQLite file.
+
+Each record is one attempt at an exercise by a logged in learner: a dict with user_id, exercise (the exercise's id),
+kind ("simple" or "chat"), version (for chats, which version of the chat it is), data (the attempt, as JSON) and
+created_at. A chat is saved a turn at a time: the first record of a version holds its whole transcript, and later
+records hold the messages each turn added (see apply_chat_record). Records are saved by a background thread in
+batches, so saving never slows down a rerun.
+"""
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+
+from settings import settings
+from telemetry import metrics
+
+
+class HistoryStore(ABC):
+    @abstractmethod
+    def save(self, records: list[dict]):
+        ...
+
+    @abstractmethod
+    def load(self, user_id: str, exercise: str) -> list[dict]:
+        """Returns the records of a learner's attempts at an exercise, oldest first."""
+
+
+class SQLiteHistoryStore(HistoryStore):
+    def __init__(self, path: str):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # Opened on first use, so that importing the app does not create the file. Only use it with the lock held.
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS exercise_history (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, "
+                "exercise TEXT, kind TEXT, version TEXT, data TEXT, created_at REAL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS exercise_history_user_exercise ON exercise_history (user_id, exercise)"
+            )
+            self._db.commit()
+        return self._db
+
+    def save(self, records: list[dict]):
+        with self._lock:
+            self.db.executemany(
+                "INSERT INTO exercise_history (user_id, exercise, kind, version, data, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        record["user_id"],
+                        record["exercise"],
+                        record["kind"],
+                        record["version"],
+                        json.dumps(record["data"], ensure_ascii=False),
+                        record["created_at"],
+                    )
+                    for record in records
+                ],
+            )
+            self.db.commit()
+
+    def load(self, user_id: str, exercise: str) -> list[dict]:
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT kind, version, data, created_at FROM exercise_history "
+                "WHERE user_id = ? AND exercise = ? ORDER BY id",
+                (user_id, exercise),
+            ).fetchall()
+        return [
+            {"user_id": user_id, "exercise": exercise, "kind": kind, "version": version, "data": json.loads(data),
+             "created_at": created_at}
+            for kind, version, data, created_at in rows
+        ]
+
+
+class SupabaseHistoryStore(HistoryStore):
+    """
+    Keeps records in a Supabase table with the same columns as the SQLite table (data is jsonb). The key must be
+    allowed to read and write the table, as the app reads and writes it for every learner.
+    """
+
+    def __init__(self, create_client: Callable[[], object], table: str = "exercise_history"):
+        self._create_client = create_client
+        self._client = None
+        self.table = table
+
+    @property
+    def client(self):
+        # Created on first use, as importing supabase is slow.
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    def save(self, records: list[dict]):
+        self.client.table(self.table).insert(records).execute()
+
+    def load(self, user_id: str, exercise: str) -> list[dict]:
+        response = (
+            self.client.table(self.table)
+            .select("user_id, exercise, kind, version, data, created_at")
+            .eq("user_id", user_id)
+            .eq("exercise", exercise)
+            .order("id")
+            .execute()
+        )
+        return response.data
+
+
+class HistoryWriter:
+    """
+    Saves records to a store from a background thread, ``batch_size`` at a time or every ``flush_interval``
+    seconds. A batch which cannot be saved is tried again a few times and then dropped, as is a record which arrives
+    when ``max_pending`` records are already waiting.
+    """
+
+    def __init__(
+        self,
+        store: HistoryStore,
+        flush_interval: float = 2,
+        batch_size: int = 100,
+        max_pending: int = 10000,
+        max_attempts: int = 3,
+    ):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._queue: queue.Queue[dict] = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def put(self, record: dict):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("history_records_dropped_total")
+
+    def flush(self):
+        """Waits until every record put so far has been saved or dropped."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._save(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _save(self, batch: list[dict]):
+        for attempt in range(self.max_attempts):
+            try:
+                with metrics.timer("history_save_seconds"):
+                    self.store.save(batch)
+                return
+            except Exception:
+                time.sleep(min(30.0, 2 ** attempt))
+        metrics.inc("history_records_dropped_total", len(batch))
+
+
+def history_record(user_id: str, exercise: str, kind: str, data, version: Optional[str] = None) -> dict:
+    return {
+        "user_id": user_id,
+        "exercise": exercise,
+        "kind": kind,
+        "version": version,
+        "data": data,
+        "created_at": time.time(),
+    }
+
+
+def chat_record(messages: list[dict], start: int) -> dict:
+    """The data of a chat record which saves the messages of a version from index start on."""
+    return {"start": start, "messages": messages[start:]}
+
+
+def apply_chat_record(messages: list[dict], data) -> list[dict]:
+    """Adds the messages saved in a chat record to the messages of its version saved before it."""
+    # Records saved before chats were saved a turn at a time hold the whole transcript.
+    if isinstance(data, list):
+        return data
+    return messages[: data["start"]] + data["messages"]
+
+
+def create_history_store() -> Optional[HistoryStore]:
+    if settings.HISTORY_BACKEND == "supabase":
+
+        def create_client():
+            from supabase import create_client
+
+            return create_client(settings.SUPABASE_URL, settings.HISTORY_SUPABASE_KEY or settings.SUPABASE_KEY)
+
+        return SupabaseHistoryStore(create_client, settings.HISTORY_SUPABASE_TABLE)
+    if settings.HISTORY_BACKEND == "sqlite":
+        return SQLiteHistoryStore(settings.HISTORY_SQLITE_PATH)
+    return None
+
+
+history_store = create_history_store()
+history_writer = (
+    HistoryWriter(history_store, settings.HISTORY_FLUSH_INTERVAL, settings.HISTORY_BATCH_SIZE)
+    if history_store is not None
+    else None
+)
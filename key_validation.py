@@ -0,0 +1,73 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from llm import get_backend
+from openai_clients import hash_api_key
+from settings import settings
+
+
+class KeyValidator:
+    """
+    Checks API keys in the background and remembers the results, so that a key which is shared by a class is only
+    checked once.
+
+    Accepted keys are remembered for ``ttl`` seconds and rejected keys for ``failure_ttl`` seconds. Keys which could
+    not be checked (e.g. because the API is down) are not remembered. Keys are stored as hashes, and expired ones are
+    dropped whenever a result is remembered, so that mistyped keys do not pile up.
+    """
+
+    def __init__(
+        self,
+        check: Callable[[str], bool],
+        ttl: float = 3600,
+        failure_ttl: float = 60,
+        max_workers: int = 4,
+    ):
+        self.check = check
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="key-validation")
+        self._results: dict[str, tuple[float, bool]] = {}
+        self._pending: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def validate(self, api_key: str) -> Future:
+        """Returns a future which resolves to whether api_key is valid. It is already done if the result is cached."""
+        key = hash_api_key(api_key)
+
+        with self._lock:
+            if key in self._results:
+                expires, valid = self._results[key]
+                if time.monotonic() < expires:
+                    future = Future()
+                    future.set_result(valid)
+                    return future
+                del self._results[key]
+
+            if key in self._pending:
+                return self._pending[key]
+
+            future = self._executor.submit(self.check, api_key)
+            self._pending[key] = future
+
+        # The callback runs straight away if the check is already done, so it must be added without the lock.
+        future.add_done_callback(lambda done: self._remember(key, done))
+        return future
+
+    def _remember(self, key: str, future: Future):
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.exception() is None:
+                now = time.monotonic()
+                self._results = {stored: result for stored, result in self._results.items() if result[0] > now}
+                valid = future.result()
+                self._results[key] = (now + (self.ttl if valid else self.failure_ttl), valid)
+
+
+key_validator = KeyValidator(
+    lambda api_key: get_backend().check_key(api_key),
+    ttl=settings.OPENAI_KEY_CACHE_TTL,
+    failure_ttl=settings.OPENAI_KEY_FAILURE_CACHE_TTL,
+)
@@ -0,0 +1,346 @@
+import functools
+import queue
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Iterable, Optional
+
+from openai_clients import ClientPool, client_pool
+from rate_limit import Permit, RateLimiter, rate_limiter
+from settings import settings
+from telemetry import metrics
+from token_budget import count_message_tokens
+
+
+class ChatStream:
+    """
+    The text of a streamed completion, built from chunks in the OpenAI chat completions format.
+    Token usage is available once the stream has been consumed, if the backend reported it.
+    """
+
+    def __init__(self, chunks: Iterable):
+        self._chunks = chunks
+        self.usage = None
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if getattr(chunk, "usage", None):
+                self.usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def close(self):
+        """Stops the response, e.g. when another request answered first."""
+        close = getattr(self._chunks, "close", None)
+        if close:
+            close()
+
+
+class LLMBackend(ABC):
+    """The interface between the exercise widgets and a large language model."""
+
+    model: str
+
+    @abstractmethod
+    def stream_chat(self, messages: list[dict], api_key: str, **params) -> ChatStream:
+        ...
+
+    @abstractmethod
+    def check_key(self, api_key: str) -> bool:
+        """Returns whether the API key is accepted."""
+
+
+class OpenAIBackend(LLMBackend):
+    """Calls the OpenAI API, or any server speaking the same API, with pooled clients."""
+
+    def __init__(self, model: str, pool: ClientPool):
+        self.model = model
+        self.pool = pool
+
+    def stream_chat(self, messages: list[dict], api_key: str, **params) -> ChatStream:
+        response = self.pool.get(api_key).chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **params,
+        )
+        return ChatStream(response)
+
+    def check_key(self, api_key: str) -> bool:
+        from openai import AuthenticationError, NotFoundError, PermissionDeniedError
+
+        # Retrieving the model is much smaller than listing every model, and also checks that the key can use it.
+        try:
+            self.pool.get(api_key).models.retrieve(self.model)
+        except AuthenticationError:
+            return False
+        except (NotFoundError, PermissionDeniedError) as e:
+            raise ModelUnavailable(self.model) from e
+        return True
+
+
+class ModelUnavailable(Exception):
+    """The API key is accepted, but it cannot use the model."""
+
+    def __init__(self, model: str):
+        super().__init__(f"This API key cannot use {model}")
+        self.model = model
+
+
+class FirstTokenTimeout(TimeoutError):
+    pass
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a request which failed with error may succeed if it is sent again."""
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(error, (FirstTokenTimeout, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class _Attempt:
+    """A request whose text is read by a background thread into a queue shared with other attempts."""
+
+    def __init__(
+        self,
+        start: Callable[[], ChatStream],
+        events: queue.Queue,
+        acquire: Optional[Callable[[], Optional[Permit]]] = None,
+    ):
+        self.started = time.monotonic()
+        self.stream: Optional[ChatStream] = None
+        self.cancelled = False
+        self._start = start
+        self._acquire = acquire
+        self._events = events
+        threading.Thread(target=self._read, name="llm-attempt", daemon=True).start()
+
+    def _read(self):
+        # Each event is (attempt, text, error). Text is None once the response has ended.
+        permit = None
+        try:
+            if self._acquire is not None:
+                permit = self._acquire()
+                if self.cancelled:
+                    return
+                # The time to first token is measured from when the request is sent.
+                self.started = time.monotonic()
+            self.stream = self._start()
+            if self.cancelled:
+                self.stream.close()
+                return
+            for text in self.stream:
+                if self.cancelled:
+                    return
+                self._events.put((self, text, None))
+        except Exception as e:
+            self._events.put((self, None, e))
+            return
+        finally:
+            if permit is not None:
+                permit.release()
+        self._events.put((self, None, None))
+
+    def cancel(self):
+        self.cancelled = True
+        if self.stream is not None:
+            try:
+                self.stream.close()
+            except Exception:
+                pass
+
+
+class ResilientStream:
+    """The text of the first attempt to answer, which is retried and hedged as set out by its backend."""
+
+    def __init__(
+        self,
+        backend: "ResilientBackend",
+        start: Callable[[], ChatStream],
+        acquire: Optional[Callable[[float, bool], Permit]] = None,
+    ):
+        self.backend = backend
+        self._start = start
+        self._acquire = acquire
+        self._winner: Optional[_Attempt] = None
+
+    @property
+    def usage(self):
+        return self._winner.stream.usage if self._winner and self._winner.stream else None
+
+    def _first_token(self, events: queue.Queue, retry: int) -> tuple[_Attempt, Optional[str]]:
+        """Waits for the first token of an attempt, hedging if it is slow. Raises the error of the last failure."""
+        backend = self.backend
+        started = time.monotonic()
+        deadline = started + backend.first_token_timeout
+        hedge_at = started + backend.hedge_delay() if backend.hedge else None
+
+        # The caller waited for the rate limiter before the first request, but retries and hedges are requests of
+        # their own. A retry takes the place of the failed request in the caller's stream, and waits for the limiter
+        # no longer than the first token is waited for. A hedge is another stream, which is only sent if the limiter
+        # lets it go straight away.
+        def acquire(hedge: bool) -> Optional[Permit]:
+            if self._acquire is None:
+                return None
+            if hedge:
+                return self._acquire(0, True)
+            return self._acquire(max(0.0, deadline - time.monotonic()), False)
+
+        attempts = [_Attempt(self._start, events, functools.partial(acquire, False) if retry else None)]
+
+        while True:
+            wait_until = min(deadline, hedge_at) if hedge_at else deadline
+            try:
+                attempt, text, error = events.get(timeout=max(0.0, wait_until - time.monotonic()))
+            except queue.Empty:
+                if hedge_at and time.monotonic() < deadline:
+                    hedge_at = None
+                    metrics.inc("llm_hedged_requests_total", model=backend.model)
+                    attempts.append(_Attempt(self._start, events, functools.partial(acquire, True)))
+                    continue
+                for attempt in attempts:
+                    attempt.cancel()
+                raise FirstTokenTimeout(f"No token was received in {backend.first_token_timeout}s")
+
+            if error is not None:
+                attempts.remove(attempt)
+                if not attempts:
+                    raise error
+                continue
+
+            for other in attempts:
+                if other is not attempt:
+                    other.cancel()
+            return attempt, text
+
+    def __iter__(self):
+        backend = self.backend
+        retry = 0
+        while True:
+            events = queue.Queue()
+            try:
+                attempt, text = self._first_token(events, retry)
+                break
+            except Exception as e:
+                if retry >= backend.max_retries or not is_retryable(e):
+                    raise
+                metrics.inc("llm_retries_total", model=backend.model)
+                time.sleep(backend.retry_delay(retry, e))
+                retry += 1
+
+        self._winner = attempt
+        backend.record_first_token(time.monotonic() - attempt.started)
+
+        # Once a token has been shown the request cannot be sent again, so later errors are raised.
+        try:
+            while text is not None:
+                yield text
+                event_attempt, text, error = events.get()
+                while event_attempt is not attempt:
+                    event_attempt, text, error = events.get()
+                if error is not None:
+                    raise error
+        except GeneratorExit:
+            attempt.cancel()
+            raise
+
+
+class ResilientBackend(LLMBackend):
+    """
+    Wraps a backend with a timeout for the first token, retries with jittered exponential backoff for failures
+    before the first token, and optionally hedging: a second request is sent if the first is slower than the p95
+    time to first token of recent requests, and the first to answer is used.
+
+    Callers wait for the rate limiter before streaming. Retries and hedges also wait for the limiter if one is given.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        first_token_timeout: float = 30,
+        max_retries: int = 2,
+        retry_base_delay: float = 0.5,
+        retry_max_delay: float = 8,
+        hedge: bool = False,
+        hedge_delay: float = 3,
+        window: int = 200,
+        limiter: Optional[RateLimiter] = None,
+    ):
+        self.backend = backend
+        self.limiter = limiter
+        self.model = backend.model
+        self.first_token_timeout = first_token_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.hedge = hedge
+        self.default_hedge_delay = hedge_delay
+        self._first_tokens: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_first_token(self, seconds: float):
+        with self._lock:
+            self._first_tokens.append(seconds)
+
+    def hedge_delay(self) -> float:
+        """The p95 time to first token of recent requests, or the default until 20 requests have been seen."""
+        with self._lock:
+            if len(self._first_tokens) < 20:
+                return self.default_hedge_delay
+            samples = sorted(self._first_tokens)
+        return samples[int(len(samples) * 0.95)]
+
+    def retry_delay(self, retry: int, error: Exception) -> float:
+        # Honour the server's Retry-After when it gives one, e.g. on rate limits.
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.retry_max_delay)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** retry))
+
+    def stream_chat(self, messages: list[dict], api_key: str, **params) -> ResilientStream:
+        def start() -> ChatStream:
+            return self.backend.stream_chat(messages, api_key, **params)
+
+        def acquire(timeout: float, stream: bool) -> Permit:
+            return self.limiter.acquire(api_key, count_message_tokens(messages), timeout=timeout, stream=stream)
+
+        return ResilientStream(self, start, acquire if self.limiter is not None else None)
+
+    def check_key(self, api_key: str) -> bool:
+        return self.backend.check_key(api_key)
+
+
+_backend: Optional[LLMBackend] = None
+
+
+def get_backend() -> LLMBackend:
+    global _backend
+    if _backend is None:
+        _backend = ResilientBackend(
+            OpenAIBackend(settings.LLM_MODEL, client_pool),
+            first_token_timeout=settings.LLM_FIRST_TOKEN_TIMEOUT,
+            max_retries=settings.LLM_MAX_RETRIES,
+            retry_base_delay=settings.LLM_RETRY_BASE_DELAY,
+            retry_max_delay=settings.LLM_RETRY_MAX_DELAY,
+            hedge=settings.LLM_HEDGE,
+            hedge_delay=settings.LLM_HEDGE_DELAY,
+            limiter=rate_limiter,
+        )
+    return _backend
+
+
+def set_backend(backend: LLMBackend):
+    """Replaces the backend used by the exercise widgets, e.g. in tests and benchmarks."""
+    global _backend
+    _backend = backend
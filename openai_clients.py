@@ -0,0 +1,104 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from settings import settings
+
+
+def hash_api_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class ClientPool:
+    """
+    Keeps one OpenAI client per API key, so that sessions using the same key reuse its keep-alive connections
+    instead of paying for a new TLS handshake on every request.
+
+    Keys are stored as hashes. The pool holds at most ``max_clients`` clients, and clients which have not been
+    used for ``idle_timeout`` seconds are dropped. Dropped clients are not closed, as a session may still be streaming
+    through one; their connections are closed when nothing uses them any more and they are garbage collected.
+    """
+
+    def __init__(
+        self,
+        max_clients: int = 256,
+        idle_timeout: float = 600,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30,
+        base_url: Optional[str] = None,
+        factory: Optional[Callable[[str], object]] = None,
+        connect_timeout: float = 5,
+        read_timeout: float = 30,
+    ):
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.base_url = base_url
+        self.factory = factory or self._create_client
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._clients: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _create_client(self, api_key: str):
+        import httpx
+        import openai
+
+        return openai.Client(
+            api_key=api_key,
+            base_url=self.base_url,
+            # The read timeout applies to each chunk of a stream. Retries are left to llm.ResilientBackend.
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            max_retries=0,
+            http_client=openai.DefaultHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                )
+            ),
+        )
+
+    def get(self, api_key: str):
+        key = hash_api_key(api_key)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_idle(now)
+
+            if key in self._clients:
+                client = self._clients[key][1]
+            else:
+                client = self.factory(api_key)
+
+            self._clients[key] = (now, client)
+            self._clients.move_to_end(key)
+
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+
+        return client
+
+    def _evict_idle(self, now: float):
+        for key in [key for key, (last_used, _) in self._clients.items() if now - last_used > self.idle_timeout]:
+            del self._clients[key]
+
+    def __len__(self):
+        return len(self._clients)
+
+
+client_pool = ClientPool(
+    max_clients=settings.OPENAI_POOL_MAX_CLIENTS,
+    idle_timeout=settings.OPENAI_POOL_IDLE_TIMEOUT,
+    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+    base_url=settings.LLM_BASE_URL,
+    connect_timeout=settings.LLM_CONNECT_TIMEOUT,
+    read_timeout=settings.LLM_READ_TIMEOUT,
+)
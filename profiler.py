@@ -0,0 +1,83 @@
+"""
+Profiles one rerun of the app with cProfile, for operators looking for what makes a page slow.
+
+Open a page with ``?profile=<PROFILER_TOKEN>``, or with ``?profile=1`` when logged in as one of the
+PROFILER_ADMIN_USER_IDS. The rerun is profiled from welcome_mat() to the footer, including the page and its widgets,
+and the slowest functions are shown at the bottom of the page. The profile is saved in PROFILER_DIR, where it can be
+opened with ``python -m pstats`` or as a flame graph with snakeviz. Fragment reruns and worker threads are not
+profiled.
+"""
+import cProfile
+import hmac
+import pstats
+import time
+from pathlib import Path
+from typing import Optional
+
+import streamlit as st
+
+from settings import settings
+
+
+def profiling_allowed(param: Optional[str], user_id: Optional[str]) -> bool:
+    if not param:
+        return False
+    if settings.PROFILER_TOKEN and hmac.compare_digest(param.encode(), settings.PROFILER_TOKEN.encode()):
+        return True
+    return user_id is not None and user_id in settings.PROFILER_ADMIN_USER_IDS
+
+
+def start_profile() -> Optional[cProfile.Profile]:
+    """Starts profiling this rerun if an operator asked for it. The query param is removed, so only one is profiled."""
+    # A rerun which was interrupted, e.g. by st.rerun(), did not stop its profile.
+    leftover = st.session_state.pop("rerun_profile", None)
+    if leftover is not None:
+        leftover.disable()
+
+    auth_session = st.session_state.get("auth_session")
+    if not profiling_allowed(st.query_params.get("profile"), auth_session.user_id if auth_session else None):
+        return None
+    del st.query_params["profile"]
+
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler is running in this thread.
+        return None
+    st.session_state["rerun_profile"] = profile
+    return profile
+
+
+def profile_rows(profile: cProfile.Profile, limit: int = 50) -> list[dict]:
+    """The functions which took the most time, including the functions they called."""
+    stats = pstats.Stats(profile)
+    rows = [
+        {
+            "function": f"{name} ({Path(file).name}:{line})" if line else name,
+            "calls": calls,
+            "own seconds": round(own_time, 4),
+            "total seconds": round(total_time, 4),
+        }
+        for (file, line, name), (_, calls, own_time, total_time, _) in stats.stats.items()
+    ]
+    rows.sort(key=lambda row: row["total seconds"], reverse=True)
+    return rows[:limit]
+
+
+def save_profile(profile: cProfile.Profile, directory: str, page: str) -> Path:
+    path = Path(directory) / f"{time.strftime('%Y%m%d-%H%M%S')}-{page.replace('/', '_') or 'home'}.prof"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profile.dump_stats(path)
+    return path
+
+
+def show_profile(profile: cProfile.Profile, page: str):
+    """Stops profiling the rerun, saves the profile and shows the slowest functions."""
+    profile.disable()
+    st.session_state.pop("rerun_profile", None)
+    path = save_profile(profile, settings.PROFILER_DIR, page)
+
+    with st.expander("Profile of this rerun", expanded=True):
+        st.caption(f"Saved to {path}. Open it with `snakeviz {path}` for a flame graph.")
+        st.dataframe(profile_rows(profile), hide_index=True, use_container_width=True)
@@ -1,9 +1,44 @@
-import datetime
-from typing import Optional, Literal, TypedDict, List, Union
+import queue
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Literal,
+    TypedDict,
+    List,
+    Union,
+)
 
-import openai
 import streamlit as st
-from pydantic import BaseModel
+
+from batch_runner import BatchRow, BatchRunner, export_csv, read_rows
+from exercise_history import ExerciseHistory, SimplePromptHistoryItem
+from history_store import (
+    apply_chat_record,
+    chat_record,
+    history_record,
+    history_store,
+    history_writer,
+)
+from llm import FirstTokenTimeout, get_backend
+from rate_limit import QueueTimeout, rate_limiter
+from response_cache import ResponseCache, replay
+from response_pool import Prewarmer, ResponsePool
+from settings import settings
+from telemetry import metrics
+from templating import expand_template, template_fields, unique_variants
+from token_budget import count_message_tokens, count_tokens, trim_messages
+from transcript_tree import TranscriptTree
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    path=settings.RESPONSE_CACHE_PATH,
+)
 
 
 def check_openai_key():
@@ -20,24 +55,352 @@ def check_openai_key():
     return False
 
 
-class SimplePromptHistoryItem(BaseModel):
-    user: str
-    assistant: Optional[str] = None
-    date: datetime.datetime = datetime.datetime.now()
+def history_user_id() -> Optional[str]:
+    """
+    The learner whose exercise history is kept across sessions, if history is kept and
+    they are logged in.
+    """
+    if history_store is None:
+        return None
+    auth_session = st.session_state.get("auth_session")
+    return auth_session.user_id if auth_session is not None else None
+
+
+def touch_auth_session():
+    """
+    Marks the learner's login as in use, so that its tokens keep being refreshed while
+    they work on a page. The exercises rerun as fragments, which do not reach
+    welcome_mat().
+    """
+    auth_session = st.session_state.get("auth_session")
+    if auth_session is not None:
+        auth_session.touch()
+
+
+def load_history(user_id: str, exercise: str, kind: str) -> list[dict]:
+    """
+    The learner's saved attempts at an exercise. If they cannot be loaded, the exercise
+    starts afresh.
+    """
+    try:
+        with metrics.timer("history_load_seconds"):
+            return [
+                record
+                for record in history_store.load(user_id, exercise)
+                if record["kind"] == kind
+            ]
+    except Exception:
+        return []
+
+
+def save_history(exercise: str, kind: str, data, version: Optional[str] = None):
+    """
+    Saves an attempt at an exercise in the background, if the learner's history is kept.
+    """
+    user_id = history_user_id()
+    if user_id is not None:
+        history_writer.put(history_record(user_id, exercise, kind, data, version))
+
+
+def stream_chat_completion(
+    messages: list[dict],
+    api_key: str,
+    use_cache: bool = True,
+    on_wait: Optional[Callable[[int], None]] = None,
+):
+    """
+    Streams the completion for messages, replaying it from the response cache if the
+    same messages were sent before. Pass use_cache=False for exercises which are about
+    the randomness of the LLM.
+
+    Requests wait in line for the rate limiter, and on_wait is called with their place
+    in the line (see RateLimiter.acquire). This does not touch the session state, so it
+    can be consumed from a worker thread.
+    """
+    backend = get_backend()
+    key = ResponseCache.make_key(backend.model, messages) if use_cache else None
+
+    if key:
+        cached = response_cache.get(key)
+        if cached is not None:
+            metrics.inc("llm_cache_hits_total", model=backend.model)
+            yield from replay(cached)
+            return
+
+    with metrics.timer("llm_queue_wait_seconds", model=backend.model):
+        permit = rate_limiter.acquire(
+            api_key,
+            count_message_tokens(messages),
+            on_wait=on_wait,
+            timeout=settings.LLM_QUEUE_TIMEOUT,
+        )
+
+    with permit:
+        start = time.perf_counter()
+        first_token = None
+
+        stream = backend.stream_chat(messages, api_key)
+
+        response = []
+        for text in stream:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+                metrics.observe(
+                    "llm_time_to_first_token_seconds", first_token, model=backend.model
+                )
+            response.append(text)
+            yield text
+
+        total = time.perf_counter() - start
+        metrics.observe("llm_response_seconds", total, model=backend.model)
+        if stream.usage:
+            permit.record(stream.usage.completion_tokens)
+            metrics.inc(
+                "llm_prompt_tokens_total",
+                stream.usage.prompt_tokens,
+                model=backend.model,
+            )
+            metrics.inc(
+                "llm_completion_tokens_total",
+                stream.usage.completion_tokens,
+                model=backend.model,
+            )
+            if first_token is not None and total > first_token:
+                metrics.observe(
+                    "llm_tokens_per_second",
+                    stream.usage.completion_tokens / (total - first_token),
+                    model=backend.model,
+                )
+        else:
+            permit.record(count_tokens("".join(response)))
+
+    if key:
+        response_cache.set(key, "".join(response))
+
+
+response_pool = ResponsePool()
+prewarmer = Prewarmer(
+    response_pool,
+    lambda messages: "".join(
+        stream_chat_completion(messages, settings.PREWARM_OPENAI_KEY, use_cache=False)
+    ),
+    lambda messages: ResponseCache.make_key(get_backend().model, messages),
+    size=settings.PREWARM_POOL_SIZE,
+    interval=settings.PREWARM_INTERVAL,
+    chat_token_budget=settings.CHAT_TOKEN_BUDGET,
+    max_variants=settings.MATRIX_MAX_VARIANTS,
+)
+
+
+def start_prewarming():
+    """
+    Starts filling the response pool with the scripted inputs of the course's exercises,
+    if it is turned on. The exercises start it when they are first shown, so that pages
+    without exercises do not need this module.
+    """
+    if settings.PREWARM_OPENAI_KEY:
+        from routes import route_registry
+
+        prewarmer.start([page.path for page in route_registry.pages])
+
+
+def prewarmed_streams(
+    messages: list[dict], count: int = 1, use_cache: bool = True
+) -> Optional[list[Iterator[str]]]:
+    """
+    Streams of count different prewarmed responses to messages, or None if there are not
+    enough of them. Each session gets them once for the same messages, so that
+    submitting again asks the model. Exercises which pass use_cache=False always ask the
+    model, like stream_chat_completion().
+    """
+    if not use_cache:
+        return None
+    served = st.session_state.setdefault("prewarmed_served", set())
+    key = ResponseCache.make_key(get_backend().model, messages)
+    if key in served:
+        return None
+    responses = response_pool.sample(key, count)
+    if responses is None:
+        return None
+    served.add(key)
+    metrics.inc("llm_prewarmed_hits_total", count, model=get_backend().model)
+    return [replay(response) for response in responses]
+
+
+def show_queue_position(placeholder) -> Callable[[int], None]:
+    """
+    Returns an on_wait callback for stream_chat_completion which shows the place in line
+    in placeholder.
+    """
+
+    def on_wait(position: int):
+        if position:
+            placeholder.caption(
+                "⏳ Many people are using the exercises right now. "
+                f"You are number {position} in line."
+            )
+        else:
+            placeholder.empty()
+
+    return on_wait
+
+
+def llm_unavailable_errors() -> tuple[type[Exception], ...]:
+    """
+    The errors which mean that the LLM cannot answer right now, which are shown to the
+    learner as a message.
+    """
+    from openai import RateLimitError
+
+    return QueueTimeout, FirstTokenTimeout, RateLimitError
+
+
+def show_llm_error(error: Exception):
+    if isinstance(error, QueueTimeout):
+        message = (
+            "Too many people are using the exercises right now. "
+            "Please wait a minute and submit again."
+        )
+    elif isinstance(error, FirstTokenTimeout):
+        message = "The model took too long to answer. Please submit again."
+    else:
+        message = (
+            "Your OpenAI API key has hit its rate limit or run out of credit. "
+            "Please wait a minute and submit again, "
+            "or check your usage at https://platform.openai.com/usage."
+        )
+    st.error(message, icon="⏳")
+
+
+def coalesce(
+    stream: Iterable[str],
+    interval: float = settings.STREAM_BATCH_SECONDS,
+    max_chars: int = settings.STREAM_BATCH_CHARS,
+) -> Iterator[str]:
+    """
+    Joins the chunks of stream into batches, so that the browser is sent one update per
+    batch instead of one per token. The first chunk is passed on straight away, and then
+    a batch is passed on once it is ``interval`` seconds old or ``max_chars`` long. Pass
+    interval=0 to pass every chunk on.
+    """
+    buffer = []
+    size = 0
+    flushed = None
+    for chunk in stream:
+        if flushed is None:
+            flushed = time.monotonic()
+            yield chunk
+            continue
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= max_chars or time.monotonic() - flushed >= interval:
+            flushed = time.monotonic()
+            yield "".join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def write_streams(streams: list, placeholders: list) -> list[str]:
+    """
+    Consumes several streams at the same time in a thread pool, writing each one to its
+    placeholder as its chunks arrive. Only the calling thread writes to streamlit.
+    Returns the full responses.
+    """
+    responses = [""] * len(streams)
+    updates = queue.Queue()
+
+    def consume(index, stream):
+        try:
+            for chunk in stream:
+                updates.put((index, chunk))
+        finally:
+            updates.put((index, None))
+
+    with ThreadPoolExecutor(max_workers=len(streams)) as executor:
+        futures = [
+            executor.submit(consume, index, stream)
+            for index, stream in enumerate(streams)
+        ]
+
+        remaining = len(streams)
+        while remaining:
+            index, chunk = updates.get()
+            if chunk is None:
+                remaining -= 1
+                continue
+            responses[index] += chunk
+            placeholders[index].markdown(responses[index] + "▌")
+
+    for future in futures:
+        future.result()
+
+    for placeholder, response in zip(placeholders, responses):
+        placeholder.markdown(response)
+
+    return responses
 
 
 def simple_prompt(title, **kwargs):
+    # The id under which learners' attempts are kept. Give one which does not change
+    # when the title is edited.
+    exercise_id = kwargs.get("exercise_id", title)
     default_text = kwargs["default_text"] if "default_text" in kwargs else ""
     long = kwargs["long"] if "long" in kwargs else True
+    cache = kwargs.get("cache", True)
+    samples = kwargs.get("samples", 1)
+    max_history = kwargs.get("max_history", settings.EXERCISE_HISTORY_MAX_ITEMS)
+    # How streamed responses are batched before they are shown, see coalesce().
+    stream_batch = (
+        kwargs.get("stream_batch_seconds", settings.STREAM_BATCH_SECONDS),
+        kwargs.get("stream_batch_chars", settings.STREAM_BATCH_CHARS),
+    )
+
+    if not isinstance(samples, int) or samples < 1:
+        raise ValueError("samples must be a positive integer")
 
     if check_openai_key():
         return
 
+    start_prewarming()
+    return _simple_prompt_exercise(
+        title,
+        exercise_id,
+        default_text,
+        long,
+        cache,
+        samples,
+        max_history,
+        stream_batch,
+    )
+
+
+# The exercises run as fragments, so that submitting one or moving its slider only
+# reruns that exercise instead of the whole page.
+@st.fragment
+def _simple_prompt_exercise(
+    title: str,
+    exercise_id: str,
+    default_text: str,
+    long: bool,
+    cache: bool,
+    samples: int,
+    max_history: int,
+    stream_batch: tuple[float, int],
+):
+    touch_auth_session()
     content_key = f"exercise-area-{title}-content"
     history_key = f"exercise-area-{title}-history"
+    pending_key = f"exercise-area-{title}-pending"
 
     if content_key not in st.session_state:
-        st.session_state[content_key] = []
+        exercise_history = ExerciseHistory(max_history)
+        user_id = history_user_id()
+        if user_id is not None:
+            for record in load_history(user_id, exercise_id, "simple"):
+                exercise_history.append(SimplePromptHistoryItem(**record["data"]))
+        st.session_state[content_key] = exercise_history
 
     if history_key not in st.session_state:
         st.session_state[history_key] = (
@@ -58,8 +421,13 @@ def simple_prompt(title, **kwargs):
         submitted = st.form_submit_button("Submit", type="primary")
 
         if submitted:
-            st.session_state[content_key].append(SimplePromptHistoryItem(user=prompt))
+            pending_items = [
+                SimplePromptHistoryItem(user=prompt) for _ in range(samples)
+            ]
+            for item in pending_items:
+                st.session_state[content_key].append(item)
             st.session_state[history_key] = len(st.session_state[content_key])
+            st.session_state[pending_key] = pending_items
 
     with exercise_container:
         if len(st.session_state[content_key]) > 0:
@@ -72,25 +440,86 @@ def simple_prompt(title, **kwargs):
                 )
                 st.write(current_history_item.user)
 
+            # Only the attempts of this submit are answered. An earlier attempt without
+            # a response was cut off, e.g. by submitting again while it streamed, and is
+            # not asked for again.
+            pending_items = st.session_state.pop(pending_key, [])
+
             if current_history_item.assistant:
                 st.chat_message("assistant").write(current_history_item.assistant)
-            else:
+            elif not pending_items:
+                st.chat_message("assistant").caption(
+                    "This attempt was interrupted before it was answered."
+                )
+            elif len(pending_items) > 1:
+                # Several samples were asked for, so generate them side by side.
+                placeholders = []
+                for column in st.columns(len(pending_items)):
+                    with column:
+                        placeholders.append(st.chat_message("assistant").empty())
 
-                client = openai.Client(api_key=st.session_state.openai_key)
+                streams = None
+                if all(item.user == pending_items[0].user for item in pending_items):
+                    streams = prewarmed_streams(
+                        [{"role": "user", "content": pending_items[0].user}],
+                        len(pending_items),
+                        cache,
+                    )
+                if streams is None:
+                    streams = [
+                        stream_chat_completion(
+                            [{"role": "user", "content": item.user}],
+                            st.session_state.openai_key,
+                            use_cache=False,
+                        )
+                        for item in pending_items
+                    ]
 
-                with st.chat_message("assistant"):
-                    stream = client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=[{"role": "user", "content": prompt}],
-                        stream=True,
+                try:
+                    responses = write_streams(
+                        [coalesce(stream, *stream_batch) for stream in streams],
+                        placeholders,
+                    )
+                except llm_unavailable_errors() as e:
+                    show_llm_error(e)
+                    # The attempts are dropped, so that they do not stay in the history
+                    # unanswered.
+                    for item in pending_items:
+                        st.session_state[content_key].remove(item)
+                    st.session_state[history_key] = max(
+                        1, len(st.session_state[content_key])
                     )
-                    response = st.write_stream(stream)
+                    return exercise_container
 
-                current_history_item.assistant = response
+                for item, response in zip(pending_items, responses):
+                    item.assistant = response
+                    save_history(exercise_id, "simple", item.as_dict())
+            else:
+                with st.chat_message("assistant"):
+                    queue_position = st.empty()
+                    prompt_messages = [
+                        {"role": "user", "content": current_history_item.user}
+                    ]
+                    streams = prewarmed_streams(prompt_messages, use_cache=cache) or [
+                        stream_chat_completion(
+                            prompt_messages,
+                            st.session_state.openai_key,
+                            use_cache=cache,
+                            on_wait=show_queue_position(queue_position),
+                        )
+                    ]
+                    try:
+                        response = st.write_stream(coalesce(streams[0], *stream_batch))
+                    except llm_unavailable_errors() as e:
+                        show_llm_error(e)
+                        st.session_state[content_key].remove(current_history_item)
+                        st.session_state[history_key] = max(
+                            1, len(st.session_state[content_key])
+                        )
+                        return exercise_container
 
-                st.session_state[content_key][
-                    st.session_state[history_key] - 1
-                ] = current_history_item
+                current_history_item.assistant = response
+                save_history(exercise_id, "simple", current_history_item.as_dict())
 
         def update_history_key():
             st.session_state[history_key] = st.session_state[
@@ -110,6 +539,180 @@ def simple_prompt(title, **kwargs):
     return exercise_container
 
 
+def matrix_prompt(title: str, **kwargs):
+    """
+    Runs several variants of a prompt at the same time, and shows their responses side
+    by side. Give either a list of variants, or a template with one slot and the values
+    to fill it with.
+    """
+    variants: List[str] = kwargs.get("variants", [])
+    template: Optional[str] = kwargs.get("template")
+    values: List[str] = kwargs.get("values", [])
+    cache = kwargs.get("cache", True)
+    columns = kwargs.get("columns", 3)
+    max_variants = kwargs.get("max_variants", settings.MATRIX_MAX_VARIANTS)
+    max_history = kwargs.get("max_history", settings.EXERCISE_HISTORY_MAX_ITEMS)
+    stream_batch = (
+        kwargs.get("stream_batch_seconds", settings.STREAM_BATCH_SECONDS),
+        kwargs.get("stream_batch_chars", settings.STREAM_BATCH_CHARS),
+    )
+
+    if not all(isinstance(item, str) for item in [*variants, *values]):
+        raise TypeError("variants and values must be lists of strings")
+    if template is not None and variants:
+        raise TypeError("Give either variants or a template with values, not both")
+    prompts = expand_template(template, values) if template is not None else variants
+    if len(unique_variants(prompts)) > max_variants:
+        raise ValueError(
+            f"matrix_prompt runs at most {max_variants} variants, see max_variants"
+        )
+    if not isinstance(columns, int) or columns < 1:
+        raise ValueError("columns must be a positive integer")
+
+    if check_openai_key():
+        return
+
+    start_prewarming()
+    return _matrix_prompt_exercise(
+        title,
+        variants,
+        template,
+        values,
+        cache,
+        columns,
+        max_variants,
+        max_history,
+        stream_batch,
+    )
+
+
+@st.fragment
+def _matrix_prompt_exercise(
+    title: str,
+    variants: List[str],
+    template: Optional[str],
+    values: List[str],
+    cache: bool,
+    columns: int,
+    max_variants: int,
+    max_history: int,
+    stream_batch: tuple[float, int],
+):
+    touch_auth_session()
+    content_key = f"exercise-area-{title}-content"
+    history_key = f"exercise-area-{title}-history"
+
+    # Each run is a list of attempts, one for each variant.
+    if content_key not in st.session_state:
+        st.session_state[content_key] = []
+    if history_key not in st.session_state:
+        st.session_state[history_key] = 1
+    runs: list[list[SimplePromptHistoryItem]] = st.session_state[content_key]
+
+    exercise_container = st.container(border=True)
+    exercise_container.subheader(f"Exercise: {title}")
+    with exercise_container.form(key=f"{content_key}-form"):
+        if template is not None:
+            edited_template = st.text_input(
+                "Template", template, key=f"{content_key}-template"
+            )
+            edited_values = st.text_area(
+                "Values for the slot, one on each line",
+                "\n".join(values),
+                key=f"{content_key}-values",
+                height=200,
+            )
+        else:
+            edited_variants = st.text_area(
+                "Prompts, one on each line",
+                "\n".join(variants),
+                key=f"{content_key}-variants",
+                height=200,
+            )
+        submitted = st.form_submit_button("Submit all", type="primary")
+
+    with exercise_container:
+        pending = None
+        if submitted:
+            try:
+                if template is not None:
+                    prompts = expand_template(
+                        edited_template, edited_values.splitlines()
+                    )
+                else:
+                    prompts = edited_variants.splitlines()
+                prompts = unique_variants(prompts)
+                if len(prompts) > max_variants:
+                    raise ValueError(
+                        f"There are {len(prompts)} prompts, "
+                        f"but at most {max_variants} can be run at once."
+                    )
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                pending = [SimplePromptHistoryItem(user=prompt) for prompt in prompts]
+                if pending:
+                    runs.append(pending)
+                    del runs[:-max_history]
+                    st.session_state[history_key] = len(runs)
+
+        if not runs:
+            return exercise_container
+        run = pending or runs[st.session_state[history_key] - 1]
+
+        placeholders = []
+        for start in range(0, len(run), columns):
+            for item, column in zip(run[start : start + columns], st.columns(columns)):
+                with column:
+                    st.chat_message("user").write(item.user)
+                    placeholders.append(st.chat_message("assistant").empty())
+
+        if pending:
+            streams = []
+            for item in pending:
+                messages = [{"role": "user", "content": item.user}]
+                streams.extend(
+                    prewarmed_streams(messages, use_cache=cache)
+                    or [
+                        stream_chat_completion(
+                            messages, st.session_state.openai_key, use_cache=cache
+                        )
+                    ]
+                )
+            try:
+                responses = write_streams(
+                    [coalesce(stream, *stream_batch) for stream in streams],
+                    placeholders,
+                )
+            except llm_unavailable_errors() as e:
+                show_llm_error(e)
+                runs.pop()
+                st.session_state[history_key] = max(1, len(runs))
+                return exercise_container
+            for item, response in zip(pending, responses):
+                item.assistant = response
+        else:
+            for item, placeholder in zip(run, placeholders):
+                placeholder.markdown(item.assistant or "")
+
+        def update_history_key():
+            st.session_state[history_key] = st.session_state[
+                f"exercise-area-{title}-slider"
+            ]
+
+        if len(runs) > 1:
+            st.slider(
+                "History",
+                1,
+                len(runs),
+                st.session_state[history_key],
+                key=f"exercise-area-{title}-slider",
+                on_change=update_history_key,
+            )
+
+    return exercise_container
+
+
 CHAT_PROMPT_ROLE = Literal["user", "assistant", "system"]
 
 
@@ -119,9 +722,21 @@ class ChatPromptMessage(TypedDict):
 
 
 def chat_prompt(title: str, **kwargs):
+    # The id under which learners' chats are kept. Give one which does not change when
+    # the title is edited.
+    exercise_id: str = kwargs.get("exercise_id", title)
     history: List[ChatPromptMessage] = kwargs.get("history", [])
     steps: Union[List[str]] = kwargs.get("steps", [])
     long = kwargs.get("long", False)
+    cache = kwargs.get("cache", True)
+    # Older turns are trimmed when the conversation goes over the token budget. The
+    # messages in history are pinned by default, as they usually set up the exercise.
+    token_budget: Optional[int] = kwargs.get("token_budget", settings.CHAT_TOKEN_BUDGET)
+    pinned: int = kwargs.get("pinned", len(history))
+    stream_batch = (
+        kwargs.get("stream_batch_seconds", settings.STREAM_BATCH_SECONDS),
+        kwargs.get("stream_batch_chars", settings.STREAM_BATCH_CHARS),
+    )
 
     if not isinstance(history, list) or not all(
         isinstance(item, dict) and "role" in item and "content" in item
@@ -135,37 +750,111 @@ def chat_prompt(title: str, **kwargs):
     if check_openai_key():
         return
 
+    start_prewarming()
+    return _chat_prompt_exercise(
+        title,
+        exercise_id,
+        history,
+        steps,
+        long,
+        cache,
+        token_budget,
+        pinned,
+        stream_batch,
+    )
+
+
+@st.fragment
+def _chat_prompt_exercise(
+    title: str,
+    exercise_id: str,
+    history: List[ChatPromptMessage],
+    steps: List[str],
+    long: bool,
+    cache: bool,
+    token_budget: Optional[int],
+    pinned: int,
+    stream_batch: tuple[float, int],
+):
+    touch_auth_session()
     # Initialize
 
     content_key = f"exercise-area-{title}-content"
     history_key = f"exercise-area-{title}-history"
-    steps_key = f"exercise-area-{title}-steps"
+
+    # The id of each version in the history store, and how many of its messages were
+    # saved, by version.
+    saved_key = f"exercise-area-{title}-saved"
 
     if content_key not in st.session_state:
-        st.session_state[content_key] = []
-        st.session_state[content_key].append(history)
+        transcripts = TranscriptTree(history)
+        saved = {}
+        user_id = history_user_id()
+        if user_id is not None:
+            saved_versions = {}
+            for record in load_history(user_id, exercise_id, "chat"):
+                saved_versions[record["version"]] = apply_chat_record(
+                    saved_versions.get(record["version"], []), record["data"]
+                )
+            # A saved version keeps its id when it is continued, so that its turns are
+            # added to it.
+            for version_id, messages in saved_versions.items():
+                saved[transcripts.add_version(messages)] = (version_id, len(messages))
+        st.session_state[content_key] = transcripts
+        st.session_state[saved_key] = saved
 
     if history_key not in st.session_state:
         st.session_state[history_key] = 1
 
-    if steps_key not in st.session_state:
-        st.session_state[steps_key] = [0]
-
     # Set messages to correct history
 
-    messages = st.session_state[content_key][st.session_state[history_key] - 1]
+    transcripts: TranscriptTree = st.session_state[content_key]
+    saved: dict[int, tuple[str, int]] = st.session_state.setdefault(saved_key, {})
+    version = st.session_state[history_key] - 1
+    messages = transcripts.messages(version)
+    # Each submit answers one step, so the current step is the number of prompts after
+    # the exercise's history.
+    step = transcripts.count(version, "user", start=len(history))
 
     # Create exercise container
     exercise_container = st.container(border=True)
     exercise_container.subheader(f"Exercise: {title}")
 
-    # Produce conversation history in container
+    # Produce conversation history in container. The transcript is drawn once a submit
+    # has been answered, so that it includes the new turn, which is streamed below it
+    # meanwhile.
     conversation = exercise_container.container()
+    transcript_area = conversation.container()
+    turn_area = conversation.empty()
 
-    with conversation:
-        for message in messages:
-            with st.chat_message(message["role"]):
-                st.write(message["content"])
+    # The tokens sent with the last prompt of each version, shown below the conversation
+    # until the next prompt.
+    tokens_sent_key = f"exercise-area-{title}-tokens-sent"
+    tokens_sent = st.session_state.setdefault(tokens_sent_key, {})
+    tokens_sent_area = conversation.empty()
+
+    def fork(length: int):
+        st.session_state[history_key] = transcripts.fork(version, length) + 1
+
+    def show_transcript():
+        with transcript_area:
+            for index, message in enumerate(transcripts.messages(version)):
+                with st.chat_message(message["role"]):
+                    st.write(message["content"])
+                    # A new version ends just before one of the learner's prompts, so
+                    # that they can ask something else there. The exercise's history is
+                    # where every version starts, so it has no prompts to redo.
+                    if message["role"] == "user" and index >= len(history):
+                        st.button(
+                            "Branch from here",
+                            key=f"exercise-area-{title}-fork-{index}",
+                            help="Start a new version of this chat which asks "
+                            "something else instead of this prompt.",
+                            on_click=fork,
+                            args=(index,),
+                        )
+        if version in tokens_sent:
+            tokens_sent_area.caption(tokens_sent[version])
 
     # Create form area
     def get_form_area(prompt=None):
@@ -180,75 +869,82 @@ def chat_prompt(title: str, **kwargs):
                 height=500 if long else None,
             )
 
-            if (
-                len(steps) > 0
-                and st.session_state[steps_key][st.session_state[history_key] - 1] == 0
-            ):
-                with step_area.container():
-                    st.caption(f"Prompt for this step:")
-                    st.chat_message("user").write(steps[0])
-
-            def update_step():
-                if len(steps) > 0:
-                    step_text = (
-                        steps[
-                            st.session_state[steps_key][
-                                st.session_state[history_key] - 1
-                            ]
-                        ]
-                        if st.session_state[steps_key][
-                            st.session_state[history_key] - 1
-                        ]
-                        < len(steps)
-                        else ""
-                    )
-                    if step_text:
-                        with step_area.container():
-                            st.caption(f"Prompt for this step:")
-                            st.chat_message("user").write(f"{step_text}")
+            def update_step(step_index: int):
+                if step_index < len(steps):
+                    with step_area.container():
+                        st.caption(f"Prompt for this step:")
+                        st.chat_message("user").write(f"{steps[step_index]}")
+                else:
+                    step_area.empty()
+
+            update_step(step)
 
             submitted = st.form_submit_button("Submit", type="primary")
 
             if submitted:
-                messages.append({"role": "user", "content": prompt})
-
-                if len(steps) > 0:
-                    st.session_state[steps_key][st.session_state[history_key] - 1] += 1
-
-                update_step()
-
-                client = openai.Client(api_key=st.session_state.openai_key)
+                user_message = {"role": "user", "content": prompt}
+                sent_messages = [*messages, user_message]
+                if token_budget:
+                    sent_messages = trim_messages(sent_messages, token_budget, pinned)
+                trimmed = len(messages) + 1 - len(sent_messages)
+                caption = f"{count_message_tokens(sent_messages)} tokens sent" + (
+                    f" ({trimmed} earlier messages left out)" if trimmed else ""
+                )
 
-                with conversation:
+                tokens_sent_area.empty()
+                with turn_area.container():
                     st.chat_message("user").write(prompt)
                     with st.chat_message("assistant"):
-                        stream = client.chat.completions.create(
-                            model="gpt-4o-mini",
-                            messages=messages,
-                            stream=True,
-                        )
-                        response = st.write_stream(stream)
+                        queue_position = st.empty()
+                        streams = prewarmed_streams(sent_messages, use_cache=cache) or [
+                            stream_chat_completion(
+                                sent_messages,
+                                st.session_state.openai_key,
+                                use_cache=cache,
+                                on_wait=show_queue_position(queue_position),
+                            )
+                        ]
+                        try:
+                            response = st.write_stream(
+                                coalesce(streams[0], *stream_batch)
+                            )
+                        except llm_unavailable_errors() as e:
+                            # The prompt is only added to the chat once it is answered,
+                            # so it can be submitted again.
+                            show_llm_error(e)
+                            return
 
-                messages.append({"role": "assistant", "content": response})
+                turn_area.empty()
+                update_step(step + 1)
+                tokens_sent[version] = caption
+                transcripts.append(version, user_message)
+                transcripts.append(version, {"role": "assistant", "content": response})
 
-                st.session_state[content_key][
-                    st.session_state[history_key] - 1
-                ] = messages
+                # A new version is saved whole, and after that only the messages of each
+                # turn.
+                version_id, saved_count = saved.get(version, (uuid.uuid4().hex, 0))
+                transcript = transcripts.messages(version)
+                save_history(
+                    exercise_id,
+                    "chat",
+                    chat_record(transcript, saved_count),
+                    version=version_id,
+                )
+                saved[version] = (version_id, len(transcript))
 
     form_area = exercise_container.empty()
 
     with form_area:
         get_form_area()
+    show_transcript()
 
     col1, col2 = exercise_container.columns([1, 5])
     with col1:
-        reset = st.button("Reset", key=f"exercise-area-{title}-reset")
 
-        if reset:
-            st.session_state[content_key].append(history)
-            st.session_state[history_key] = len(st.session_state[content_key])
-            st.session_state[steps_key].append(0)
-            st.rerun()
+        def reset():
+            st.session_state[history_key] = transcripts.reset() + 1
+
+        st.button("Reset", key=f"exercise-area-{title}-reset", on_click=reset)
 
     with col2:
 
@@ -256,14 +952,163 @@ def chat_prompt(title: str, **kwargs):
             st.session_state[history_key] = st.session_state[
                 f"exercise-area-{title}-slider"
             ]
-            st.rerun()
 
-        if len(st.session_state[content_key]) > 1:
+        if len(transcripts) > 1:
             st.slider(
                 "History",
                 1,
-                len(st.session_state[content_key]),
+                len(transcripts),
                 st.session_state[history_key],
                 key=f"exercise-area-{title}-slider",
                 on_change=update_history_key,
             )
+
+
+def batch_prompt(title: str, **kwargs):
+    default_template = kwargs.get("default_template", "")
+    cache = kwargs.get("cache", True)
+    workers = kwargs.get("workers", settings.BATCH_WORKERS)
+    max_rows = kwargs.get("max_rows", settings.BATCH_MAX_ROWS)
+    # The results table is redrawn at most this often while the rows are answered.
+    refresh_seconds = kwargs.get("refresh_seconds", 0.5)
+
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError("workers must be a positive integer")
+
+    if check_openai_key():
+        return
+
+    return _batch_prompt_exercise(
+        title, default_template, cache, workers, max_rows, refresh_seconds
+    )
+
+
+@st.fragment
+def _batch_prompt_exercise(
+    title: str,
+    default_template: str,
+    cache: bool,
+    workers: int,
+    max_rows: int,
+    refresh_seconds: float,
+):
+    touch_auth_session()
+    content_key = f"exercise-area-{title}-content"
+
+    exercise_container = st.container(border=True)
+    exercise_container.subheader(f"Exercise: {title}")
+    with exercise_container.form(key=f"{content_key}-form"):
+        upload = st.file_uploader(
+            "Rows",
+            type=["csv", "jsonl"],
+            key=f"{content_key}-file",
+            help="A CSV file with a header row, "
+            "or a JSONL file with one object on each line.",
+        )
+        template = st.text_area(
+            "Prompt template",
+            default_template,
+            key=f"{content_key}-template",
+            height=200,
+            help="Put the name of a column in braces, like {clause}, "
+            "to fill it in from each row.",
+        )
+        submitted = st.form_submit_button("Run", type="primary")
+
+    with exercise_container:
+        if submitted:
+            try:
+                if upload is None:
+                    raise ValueError(
+                        "Upload a CSV or JSONL file to run the template over."
+                    )
+                rows = read_rows(upload.getvalue(), upload.name)
+                if not rows:
+                    raise ValueError("The file has no rows.")
+                if len(rows) > max_rows:
+                    raise ValueError(
+                        f"The file has {len(rows)} rows, "
+                        f"but at most {max_rows} can be run at once."
+                    )
+                missing = template_fields(template) - set().union(
+                    *(row.values for row in rows)
+                )
+                if missing:
+                    raise ValueError(
+                        "The template uses columns which the file does not have: "
+                        f"{', '.join(missing)}"
+                    )
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.session_state[content_key] = (rows, template)
+                run_batch(rows, template, cache, workers, refresh_seconds)
+
+        if content_key not in st.session_state:
+            return exercise_container
+        rows, template = st.session_state[content_key]
+
+        if not submitted:
+            # Rows are cancelled when the run is stopped, e.g. by leaving the page.
+            failed = sum(row.status in ("failed", "cancelled") for row in rows)
+            if failed and st.button(
+                f"Retry {failed} failed rows", key=f"{content_key}-retry"
+            ):
+                run_batch(rows, template, cache, workers, refresh_seconds)
+            else:
+                st.dataframe([row.as_dict() for row in rows], hide_index=True)
+
+        st.download_button(
+            "Download results",
+            "".join(export_csv(rows)),
+            file_name=f"{title}.csv",
+            mime="text/csv",
+            key=f"{content_key}-download",
+        )
+
+    return exercise_container
+
+
+def run_batch(
+    rows: list[BatchRow],
+    template: str,
+    cache: bool,
+    workers: int,
+    refresh_seconds: float,
+):
+    """
+    Answers the rows which are not done, showing their progress in a table which fills
+    in as they finish.
+    """
+    api_key = st.session_state.openai_key
+    runner = BatchRunner(
+        lambda prompt: "".join(
+            stream_chat_completion(
+                [{"role": "user", "content": prompt}], api_key, use_cache=cache
+            )
+        ),
+        workers=workers,
+    )
+
+    progress = st.progress(0.0)
+    table = st.empty()
+    refreshed = 0.0
+    with metrics.timer("batch_run_seconds"):
+        for row in runner.run(rows, template):
+            if row.status in ("done", "failed"):
+                metrics.inc("batch_rows_total", status=row.status)
+            now = time.monotonic()
+            if now - refreshed >= refresh_seconds:
+                refreshed = now
+                finished = sum(row.status in ("done", "failed") for row in rows)
+                progress.progress(
+                    finished / len(rows),
+                    text=f"{finished} of {len(rows)} rows answered",
+                )
+                table.dataframe([row.as_dict() for row in rows], hide_index=True)
+
+    failed = sum(row.status == "failed" for row in rows)
+    progress.progress(
+        1.0, text=f"{len(rows) - failed} of {len(rows)} rows answered, {failed} failed"
+    )
+    table.dataframe([row.as_dict() for row in rows], hide_index=True)
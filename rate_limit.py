@@ -0,0 +1,236 @@
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from openai_clients import hash_api_key
+from settings import settings
+
+
+class QueueTimeout(TimeoutError):
+    pass
+
+
+class TokenBucket:
+    """Holds up to ``capacity`` tokens, refilled at ``rate`` tokens a second. It is not thread safe on its own."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken. Amounts over the capacity only need a full bucket."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float, now: float):
+        """Takes amount, which may leave the bucket in debt if more was used than was asked for."""
+        self._refill(now)
+        self.tokens -= amount
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class Limits:
+    """Requests a second, tokens a minute and concurrent streams. A limit of 0 or None is no limit."""
+
+    def __init__(self, requests_per_second: float = 0, tokens_per_minute: float = 0, max_concurrent: int = 0):
+        # Allow a burst of one second of requests, and one minute of tokens.
+        self.requests = TokenBucket(requests_per_second, max(1.0, requests_per_second)) if requests_per_second else None
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrent = max_concurrent
+        self.active = 0
+
+    def wait_time(self, tokens: int, now: float, stream: bool = True) -> float:
+        if stream and self.max_concurrent and self.active >= self.max_concurrent:
+            return math.inf
+        return max(
+            self.requests.wait_time(1, now) if self.requests else 0.0,
+            self.tokens.wait_time(tokens, now) if self.tokens else 0.0,
+        )
+
+    def take(self, tokens: int, now: float, stream: bool = True):
+        if self.requests:
+            self.requests.take(1, now)
+        if self.tokens:
+            self.tokens.take(tokens, now)
+        if stream:
+            self.active += 1
+
+    def idle(self, now: float) -> bool:
+        """Whether these limits are as good as new: no streams, and buckets which have refilled."""
+        return self.active == 0 and all(bucket.full(now) for bucket in (self.requests, self.tokens) if bucket)
+
+
+class Permit:
+    """Lets one request stream. Release it when the stream ends, and record the tokens it generated."""
+
+    def __init__(self, limiter: "RateLimiter", key: str, stream: bool = True):
+        self.limiter = limiter
+        self.key = key
+        self.stream = stream
+        self.released = False
+
+    def record(self, tokens: int):
+        """Charges the tokens generated by the response, which were not known when the permit was given."""
+        self.limiter._charge(self.key, tokens)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.limiter._release(self.key, self.stream)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class RateLimiter:
+    """
+    Keeps requests to the LLM within limits for the whole process and for each API key, so that a class
+    submitting at the same moment waits in line instead of being rate limited by the API.
+
+    Each key has a line of its own, where its requests wait for the key's limits. Once the key's limits let a
+    request go, it joins the line for the global limits, which lets requests through in the order they arrive so that
+    no request waits forever. A key which is over its limits holds up only its own requests. Keys are stored as hashes.
+
+    The limits of keys which are as good as new are dropped at most every ``sweep_interval`` seconds, when a request
+    arrives, so that a class where everyone brings their own key does not fill the memory with them.
+    """
+
+    def __init__(self, global_limits: Limits, key_limits: Callable[[], Limits], sweep_interval: float = 60):
+        self._global = global_limits
+        self._key_limits = key_limits
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._keys: dict[str, Limits] = {}
+        self._key_queues: dict[str, deque[object]] = {}
+        self._queue: deque[object] = deque()
+        self._condition = threading.Condition()
+
+    def acquire(
+        self,
+        api_key: str,
+        tokens: int,
+        on_wait: Optional[Callable[[int], None]] = None,
+        timeout: Optional[float] = None,
+        stream: bool = True,
+    ) -> Permit:
+        """
+        Waits until a request with an estimated number of prompt tokens may be sent, and returns its permit.
+        While it waits, on_wait is called with its place in the line whenever that changes, and with 0 once it may go.
+
+        Pass stream=False for a request which takes the place of one whose permit is still held, such as a retry, so
+        that it counts against the request and token limits but not the concurrent streams.
+        """
+        key = hash_api_key(api_key)
+        ticket = object()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        position = None
+
+        with self._condition:
+            self._sweep(time.monotonic())
+            key_queue = self._key_queues.setdefault(key, deque())
+            key_queue.append(ticket)
+        try:
+            while True:
+                with self._condition:
+                    now = time.monotonic()
+                    limits = self._keys.setdefault(key, self._key_limits())
+                    wait = math.inf
+                    if ticket in self._queue:
+                        if self._queue[0] is ticket:
+                            wait = self._global.wait_time(tokens, now, stream)
+                            if wait == 0:
+                                self._global.take(tokens, now, stream)
+                                limits.take(tokens, now, stream)
+                                break
+                    elif key_queue[0] is ticket:
+                        wait = limits.wait_time(tokens, now, stream)
+                        if wait == 0:
+                            # The request stays at the head of its key's line until it goes, so the key's requests
+                            # go in order.
+                            self._queue.append(ticket)
+                            continue
+                    new_position = self._position(key_queue, ticket)
+
+                if on_wait and new_position != position:
+                    on_wait(new_position)
+                position = new_position
+
+                with self._condition:
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise QueueTimeout(f"Waited more than {timeout}s for the LLM")
+                        wait = min(wait, deadline - now)
+                    # Waiting on buckets is woken early when a request ahead goes or a stream ends.
+                    self._condition.wait(None if wait == math.inf else wait)
+        finally:
+            with self._condition:
+                key_queue.remove(ticket)
+                if not key_queue:
+                    del self._key_queues[key]
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                self._condition.notify_all()
+
+        if on_wait and position is not None:
+            on_wait(0)
+        return Permit(self, key, stream)
+
+    def _position(self, key_queue: deque, ticket: object) -> int:
+        """The place in line of a request: behind the global line, and the requests ahead of it for its key."""
+        if ticket in self._queue:
+            return self._queue.index(ticket) + 1
+        ahead = itertools.takewhile(lambda other: other is not ticket, key_queue)
+        return len(self._queue) + sum(other not in self._queue for other in ahead) + 1
+
+    def _sweep(self, now: float):
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        for key in [key for key, limits in self._keys.items() if key not in self._key_queues and limits.idle(now)]:
+            del self._keys[key]
+
+    def _charge(self, key: str, tokens: int):
+        with self._condition:
+            now = time.monotonic()
+            for limits in (self._global, self._keys.get(key)):
+                if limits and limits.tokens:
+                    limits.tokens.take(tokens, now)
+
+    def _release(self, key: str, stream: bool = True):
+        with self._condition:
+            if stream:
+                self._global.active -= 1
+            limits = self._keys.get(key)
+            if limits and stream:
+                limits.active -= 1
+            self._condition.notify_all()
+
+    def __len__(self):
+        """The number of requests waiting in line."""
+        return sum(len(key_queue) for key_queue in self._key_queues.values())
+
+
+rate_limiter = RateLimiter(
+    Limits(settings.LLM_REQUESTS_PER_SECOND, settings.LLM_TOKENS_PER_MINUTE, settings.LLM_MAX_CONCURRENT_STREAMS),
+    lambda: Limits(
+        settings.LLM_KEY_REQUESTS_PER_SECOND,
+        settings.LLM_KEY_TOKENS_PER_MINUTE,
+        settings.LLM_KEY_MAX_CONCURRENT_STREAMS,
+    ),
+)
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+
+class ResponseCache:
+    """
+    A process-wide cache of completions, shared by every session of the app.
+
+    Entries are evicted when they are least recently used (once ``max_entries`` is reached) or when they are older
+    than ``ttl`` seconds. If ``path`` is given, entries are also written to a SQLite file so that they survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: Optional[float] = 3600, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created REAL, value TEXT)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, messages: list[dict], **params) -> str:
+        payload = json.dumps(
+            {"model": model, "messages": messages, "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    entry = (row[0], row[1])
+                    self._store(key, entry)
+
+            if entry is None:
+                return None
+
+            if self._expired(entry[0]):
+                self._delete(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            entry = (time.time(), value)
+            self._store(key, entry)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, created, value) VALUES (?, ?, ?)",
+                    (key, *entry),
+                )
+                if self.ttl is not None:
+                    self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, key: str, entry: tuple[float, str]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _delete(self, key: str):
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+
+
+def replay(text: str) -> Iterator[str]:
+    """Yields a cached response word by word, so that it can be passed to st.write_stream like a live response."""
+    yield from re.findall(r"\s*\S+\s*", text) or [text]
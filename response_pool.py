@@ -0,0 +1,168 @@
+"""
+Responses generated ahead of time for the exercises' scripted inputs: the default text of each simple prompt and the
+steps of each chat. A learner's first submit of an unchanged input is answered from the pool straight away, with a
+random pick so that the answers still vary. Anything else goes to the model.
+"""
+import ast
+import random
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+from templating import expand_template, unique_variants
+from token_budget import trim_messages
+
+
+class ScriptedExercise(NamedTuple):
+    """
+    The messages an exercise starts with, and the prompts it asks the learner to send one after another. Chats are
+    trimmed to their token budget before they are sent, keeping the first ``pinned`` messages.
+    """
+
+    history: list[dict]
+    steps: list[str]
+    token_budget: Optional[int] = None
+    pinned: int = 0
+
+
+def find_scripted_exercises(
+    path: str, chat_token_budget: Optional[int] = None, max_variants: Optional[int] = None
+) -> list[ScriptedExercise]:
+    """
+    Finds the exercises in a page whose inputs are written out in the page, and whose responses may be reused.
+    chat_token_budget is the token budget of chats which do not set their own, and max_variants the most variants of
+    matrix exercises which do not set their own.
+    """
+    with open(path, encoding="utf-8") as page:
+        tree = ast.parse(page.read(), filename=path)
+
+    exercises = []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)):
+            continue
+        try:
+            arguments = {keyword.arg: ast.literal_eval(keyword.value) for keyword in node.keywords if keyword.arg}
+        except ValueError:
+            continue
+        # These exercises are about the randomness of the model, so they always ask it.
+        if not arguments.get("cache", True):
+            continue
+        if node.func.id == "simple_prompt" and arguments.get("default_text"):
+            exercises.append(ScriptedExercise([], [arguments["default_text"]]))
+        elif node.func.id == "chat_prompt" and arguments.get("steps"):
+            history = arguments.get("history", [])
+            exercises.append(
+                ScriptedExercise(
+                    history,
+                    arguments["steps"],
+                    arguments.get("token_budget", chat_token_budget),
+                    arguments.get("pinned", len(history)),
+                )
+            )
+        elif node.func.id == "matrix_prompt":
+            variants = arguments.get("variants", [])
+            if arguments.get("template"):
+                try:
+                    variants = expand_template(arguments["template"], arguments.get("values", []))
+                except ValueError:
+                    # The widget shows the error when the page is opened.
+                    continue
+            variants = unique_variants(variants)
+            if max_variants is not None and len(variants) > arguments.get("max_variants", max_variants):
+                continue
+            exercises.extend(ScriptedExercise([], [variant]) for variant in variants)
+    return exercises
+
+
+class ResponsePool:
+    """Pools of responses by the cache key of the messages they answer. Each pool is replaced when it is refilled."""
+
+    def __init__(self):
+        self._pools: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def set(self, key: str, responses: list[str]):
+        with self._lock:
+            self._pools[key] = list(responses)
+
+    def sample(self, key: str, count: int = 1) -> Optional[list[str]]:
+        """Picks count different responses at random, or returns None if the pool does not have that many."""
+        with self._lock:
+            responses = self._pools.get(key)
+            if not responses or len(responses) < count:
+                return None
+            return random.sample(responses, count)
+
+    def __len__(self):
+        return len(self._pools)
+
+
+class Prewarmer:
+    """
+    Fills a pool from a background thread, and again every ``interval`` seconds.
+
+    The first step of each exercise gets ``size`` responses. Each of them is then carried through the rest of the
+    steps with one response a step, so that a learner who follows the script is answered from the pool at every step.
+    """
+
+    def __init__(
+        self,
+        pool: ResponsePool,
+        generate: Callable[[list[dict]], str],
+        make_key: Callable[[list[dict]], str],
+        size: int = 5,
+        interval: float = 6 * 3600,
+        chat_token_budget: Optional[int] = None,
+        max_variants: Optional[int] = None,
+    ):
+        self.pool = pool
+        self.generate = generate
+        self.make_key = make_key
+        self.size = size
+        self.interval = interval
+        self.chat_token_budget = chat_token_budget
+        self.max_variants = max_variants
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self, paths: list[str]):
+        """Starts prewarming the exercises in the pages at paths, unless it was already started."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(paths,), name="prewarm", daemon=True)
+                self._thread.start()
+
+    def _run(self, paths: list[str]):
+        while True:
+            # The same prompt may be used by more than one exercise.
+            prewarmed = set()
+            for path in paths:
+                for exercise in find_scripted_exercises(path, self.chat_token_budget, self.max_variants):
+                    if repr(exercise) in prewarmed:
+                        continue
+                    prewarmed.add(repr(exercise))
+                    try:
+                        self.prewarm(exercise)
+                    except Exception:
+                        # The pool is only a head start, so the exercise just goes to the model if it fails.
+                        pass
+            time.sleep(self.interval)
+
+    def prewarm(self, exercise: ScriptedExercise):
+        def sent(messages: list[dict]) -> list[dict]:
+            # The widgets trim long chats before sending them, so the pool must be keyed by what they send.
+            if exercise.token_budget:
+                return trim_messages(messages, exercise.token_budget, exercise.pinned)
+            return messages
+
+        first = exercise.history + [{"role": "user", "content": exercise.steps[0]}]
+        responses = [self.generate(sent(first)) for _ in range(self.size)]
+        self.pool.set(self.make_key(sent(first)), responses)
+
+        for response in responses:
+            messages = first + [{"role": "assistant", "content": response}]
+            for step in exercise.steps[1:]:
+                messages = messages + [{"role": "user", "content": step}]
+                response = self.generate(sent(messages))
+                self.pool.set(self.make_key(sent(messages)), [response])
+                messages = messages + [{"role": "assistant", "content": response}]
@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import Optional
 
 import streamlit as st
@@ -106,40 +107,67 @@ data_pages = [
 ]
 
 
-def convert_section_for_routes(section: Section):
-    def convert_page(page: Page) -> st.Page:
-        title = f"{'[BETA] ' if page.beta else ''}{page.title}: Prompt Engineering for Lawyers"
-        return st.Page(
-            page.path,
-            title=title,
+class RouteRegistry:
+    """
+    The pages of the site, compiled once from a list of sections. Sections and pages are put in order without
+    changing the list, and nothing is changed afterwards, so the registry is shared by every session.
+    """
+
+    def __init__(self, sections: list[Section], root: Path = Path(__file__).parent):
+        self.sections: tuple[Section, ...] = tuple(
+            section.model_copy(update={"pages": sorted(section.pages, key=lambda page: page.page_order)})
+            for section in sorted(sections, key=lambda section: section.section_order)
         )
+        self.pages: tuple[Page, ...] = tuple(page for section in self.sections for page in section.pages)
+
+        missing = [page.path for page in self.pages if not (root / page.path).is_file()]
+        if missing:
+            raise FileNotFoundError(f"These pages do not exist: {', '.join(missing)}")
+
+        self.index: dict[str, int] = {page.path: index for index, page in enumerate(self.pages)}
+        # The previous and next pages of each page, for the navigation footer.
+        self.links: dict[str, tuple[Optional[Page], Optional[Page]]] = {
+            page.path: (
+                self.pages[index - 1] if index > 0 else None,
+                self.pages[index + 1] if index < len(self.pages) - 1 else None,
+            )
+            for index, page in enumerate(self.pages)
+        }
 
-    section.pages.sort(key=lambda x: x.page_order)
+    def st_pages(self) -> dict[str, list[st.Page]]:
+        result = {
+            "": [
+                st.Page("content/pages/Home.py", title="Home: Prompt Engineering for Lawyers", default=True, icon="🏠"),
+            ]
+        }
 
-    return {
-        section.title: [convert_page(page) for page in section.pages if page.active]
-    }
+        for section in self.sections[1:]:
+            result[section.title] = [
+                st.Page(page.path, title=f"{'[BETA] ' if page.beta else ''}{page.title}: Prompt Engineering for Lawyers")
+                for page in section.pages
+                if page.active
+            ]
 
+        return result
 
-def get_routes():
-    result = {
-        "": [
-            st.Page("content/pages/Home.py", title="Home: Prompt Engineering for Lawyers", default=True, icon="🏠"),
-        ]
-    }
 
-    data_pages.sort(key=lambda x: x.section_order)
+route_registry = RouteRegistry(data_pages)
 
-    for section in data_pages[1:]:
-        result.update(convert_section_for_routes(section))
 
-    return result
+def get_routes():
+    """
+    The pages for st.navigation. They are made once per session, as an st.Page is not safe to share between sessions
+    which run at the same time.
+    """
+    if "navigation_routes" not in st.session_state:
+        st.session_state["navigation_routes"] = route_registry.st_pages()
+    return st.session_state["navigation_routes"]
 
 
 def get_navigation():
     with st.expander("Contents", expanded=True, icon="📚"):
         st.page_link("content/pages/Home.py", label="Home", icon="🏠")
-        for section in data_pages[1:]:
+        for section in route_registry.sections[1:]:
             st.caption(section.title)
             for page in section.pages:
                 if page.active:
@@ -154,5 +182,5 @@ def get_navigation():
                     st.page_link(page.path, label=label)
 
 
-def get_routes_list() -> list[Page]:
-    return [page for section in data_pages for page in section.pages]
+def get_routes_list() -> tuple[Page, ...]:
+    return route_registry.pages
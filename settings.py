@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,5 +11,122 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_KEY: str
 
+    # Pool of Supabase auth clients, one per session, and the connections they share.
+    SUPABASE_AUTH_POOL_MAX_CLIENTS: int = 1000
+    SUPABASE_AUTH_POOL_IDLE_TIMEOUT: float = 1800
+    SUPABASE_AUTH_MAX_CONNECTIONS: int = 50
+
+    # The project's JWT secret, to verify access tokens without asking Supabase. Without
+    # it, logins are checked with Supabase. Tokens are refreshed this many seconds
+    # before they expire.
+    SUPABASE_JWT_SECRET: Optional[str] = None
+    SUPABASE_TOKEN_REFRESH_MARGIN: float = 60
+
+    # The model used by the exercises. Point the base URL at any server which speaks the
+    # OpenAI chat completions API, such as the bundled fake server (python
+    # fake_llm_server.py), to run the app without OpenAI.
+    LLM_MODEL: str = "gpt-4o-mini"
+    LLM_BASE_URL: Optional[str] = None
+
+    # Timeouts of LLM requests, in seconds. Requests which fail before their first token
+    # with a rate limit, a server error or a timeout are retried after a random delay of
+    # up to base delay * 2 ** retry, capped at the max delay. With hedging, a second
+    # request is sent if the first has no token after the p95 time to first token (or
+    # the hedge delay, until enough requests were seen), and whichever answers first is
+    # used.
+    LLM_CONNECT_TIMEOUT: float = 5
+    LLM_READ_TIMEOUT: float = 30
+    LLM_FIRST_TOKEN_TIMEOUT: float = 30
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 8
+    LLM_HEDGE: bool = False
+    LLM_HEDGE_DELAY: float = 3
+
+    # Limits on LLM requests for the whole process and for each API key. Requests over a
+    # limit wait in line (for at most the queue timeout), and are shown their place in
+    # it. A limit of 0 is no limit.
+    LLM_REQUESTS_PER_SECOND: float = 0
+    LLM_TOKENS_PER_MINUTE: int = 0
+    LLM_MAX_CONCURRENT_STREAMS: int = 64
+    LLM_KEY_REQUESTS_PER_SECOND: float = 8
+    LLM_KEY_TOKENS_PER_MINUTE: int = 200000
+    LLM_KEY_MAX_CONCURRENT_STREAMS: int = 16
+    LLM_QUEUE_TIMEOUT: float = 120
+
+    # How long the results of checking an OpenAI API key are remembered, in seconds.
+    OPENAI_KEY_CACHE_TTL: float = 3600
+    OPENAI_KEY_FAILURE_CACHE_TTL: float = 60
+
+    # Cache of completions shared by every session. Set the path to keep the cache in a
+    # SQLite file across restarts.
+    RESPONSE_CACHE_MAX_ENTRIES: int = 512
+    RESPONSE_CACHE_TTL: Optional[float] = 3600
+    RESPONSE_CACHE_PATH: Optional[str] = None
+
+    # Pool of OpenAI clients, one per API key, and the limits of each client's
+    # connection pool.
+    OPENAI_POOL_MAX_CLIENTS: int = 256
+    OPENAI_POOL_IDLE_TIMEOUT: float = 600
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_EXPIRY: float = 30
+
+    # Estimated number of tokens a chat exercise may send before older turns are left
+    # out. Set to 0 to send everything.
+    CHAT_TOKEN_BUDGET: int = 4000
+
+    # Streamed responses are sent to the browser in batches of this many seconds or
+    # characters, whichever comes first. The first token is always sent straight away.
+    STREAM_BATCH_SECONDS: float = 0.05
+    STREAM_BATCH_CHARS: int = 200
+
+    # Responses generated ahead of time for the default prompts and scripted chat steps
+    # of the exercises, so that a learner's first submit of them is answered at once.
+    # Prewarming is paid for with this API key, and is off without one. Each prompt gets
+    # a pool of this many responses, which is generated again every interval (in
+    # seconds).
+    PREWARM_OPENAI_KEY: Optional[str] = None
+    PREWARM_POOL_SIZE: int = 5
+    PREWARM_INTERVAL: float = 6 * 3600
+
+    # Batch exercises run one prompt over every row of a file, answering this many rows
+    # at a time.
+    BATCH_WORKERS: int = 8
+    BATCH_MAX_ROWS: int = 1000
+
+    # Matrix exercises send every variant of a prompt at the same time, so a learner may
+    # only run this many at once.
+    MATRIX_MAX_VARIANTS: int = 10
+
+    # Telemetry. Set the port to serve metrics in the Prometheus text format at
+    # /metrics, or the path to append every measurement to a JSONL file.
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: Optional[int] = None
+    METRICS_JSONL_PATH: Optional[str] = None
+
+    # Operators can profile one rerun by opening a page with ?profile=<token>, or with
+    # ?profile=1 when logged in as one of the admin users (Supabase user ids). Profiles
+    # are saved in the directory. Profiling is off when neither is set.
+    PROFILER_TOKEN: Optional[str] = None
+    PROFILER_ADMIN_USER_IDS: list[str] = []
+    PROFILER_DIR: str = "profiles"
+
+    # Number of attempts kept for each simple prompt exercise. The oldest attempts are
+    # dropped first.
+    EXERCISE_HISTORY_MAX_ITEMS: int = 50
+
+    # Where the exercise history of logged in learners is kept across sessions:
+    # "supabase", "sqlite" (for development) or "" for nowhere, which is the default.
+    # The Supabase key must be able to read and write the table, and defaults to
+    # SUPABASE_KEY. History is saved in batches of up to the batch size, at most this
+    # many seconds after it was made.
+    HISTORY_BACKEND: str = ""
+    HISTORY_SQLITE_PATH: str = "exercise_history.sqlite3"
+    HISTORY_SUPABASE_TABLE: str = "exercise_history"
+    HISTORY_SUPABASE_KEY: Optional[str] = None
+    HISTORY_FLUSH_INTERVAL: float = 2
+    HISTORY_BATCH_SIZE: int = 100
+
 
 settings = Settings()
@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from settings import settings
+
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Buckets for metrics which are not measured in seconds.
+BUCKETS = {
+    "llm_tokens_per_second": (5, 10, 20, 40, 60, 80, 100, 150, 200, 400),
+}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: tuple, **extra) -> str:
+    pairs = list(labels) + [(key, str(value)) for key, value in extra.items()]
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class Timer:
+    """Measures the time from its creation until stop() is called or its with block ends."""
+
+    def __init__(self, metrics: "Metrics", name: str, labels: dict):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.start = time.perf_counter()
+        self.elapsed: Optional[float] = None
+
+    def stop(self) -> float:
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self.start
+            self.metrics.observe(self.name, self.elapsed, **self.labels)
+        return self.elapsed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class Metrics:
+    """
+    A small registry of counters and histograms.
+
+    Metrics can be scraped in the Prometheus text format (see serve()) and every observation can also be appended
+    to a JSONL file for later analysis.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None):
+        self.jsonl_path = jsonl_path
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, list]] = {}
+        self._lock = threading.Lock()
+        self._jsonl = open(jsonl_path, "a", encoding="utf-8") if jsonl_path else None
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+            self._log(name, value, labels)
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = BUCKETS.get(name, DEFAULT_BUCKETS)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            # Each series is [bucket counts..., sum, count]
+            histogram = series.setdefault(_label_key(labels), [0] * len(buckets) + [0, 0])
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+            self._log(name, value, labels)
+
+    def timer(self, name: str, **labels) -> Timer:
+        return Timer(self, name, labels)
+
+    def _log(self, name: str, value: float, labels: dict):
+        if self._jsonl:
+            self._jsonl.write(json.dumps({"ts": time.time(), "name": name, "value": value, "labels": labels}) + "\n")
+            self._jsonl.flush()
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in series.items():
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                buckets = BUCKETS.get(name, DEFAULT_BUCKETS)
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in series.items():
+                    for bound, count in zip(buckets, histogram):
+                        lines.append(f"{name}_bucket{_format_labels(labels, le=bound)} {count}")
+                    lines.append(f'{name}_bucket{_format_labels(labels, le="+Inf")} {histogram[-1]}')
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-2]}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serves the metrics at http://host:port/metrics from a background thread."""
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+metrics = Metrics(jsonl_path=settings.METRICS_JSONL_PATH)
+
+if settings.METRICS_PORT:
+    metrics.serve(settings.METRICS_PORT, settings.METRICS_HOST)
@@ -0,0 +1,40 @@
+"""
+Prompt templates, which name the values to fill in with Python's format syntax, e.g. "Rewrite this clause: {clause}".
+Braces which are part of the prompt are doubled, like {{this}}. Batch exercises fill a template from each row of a
+file, and matrix exercises fill the one slot of a template with each value to make the variants of a prompt.
+"""
+import string
+from typing import Iterable
+
+
+def template_fields(template: str) -> set[str]:
+    """The columns a template fills in. Raises ValueError if the template is not valid format syntax."""
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field}
+
+
+def fill_template(template: str, values: dict[str, str]) -> str:
+    try:
+        return template.format_map(values)
+    except KeyError as e:
+        raise ValueError(f"The template uses the column {e}, which the file does not have")
+    except (AttributeError, IndexError) as e:
+        raise ValueError(f"The template cannot be filled in: {e}")
+
+
+def unique_variants(variants: Iterable[str]) -> list[str]:
+    """The variants without blanks and repeats, in their order. Variants which differ only in spacing are repeats."""
+    unique = {}
+    for variant in variants:
+        variant = variant.strip()
+        if variant:
+            unique.setdefault(" ".join(variant.split()), variant)
+    return list(unique.values())
+
+
+def expand_template(template: str, values: Iterable[str]) -> list[str]:
+    """Fills the one slot of a template, like "{context} What is will?", with each value which is not blank."""
+    slots = template_fields(template)
+    if len(slots) != 1:
+        raise ValueError("The template must have exactly one slot in braces, like {context}")
+    slot = slots.pop()
+    return [fill_template(template, {slot: value.strip()}) for value in values if value.strip()]
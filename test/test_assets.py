@@ -0,0 +1,55 @@
+import assets
+
+
+def test_minify_css():
+    css = """
+    /* Headings */
+    h1, h2 {
+        font-size: 3rem;
+        margin-top: 0.67em;
+    }
+
+    p {
+        font-size: 1.5rem !important;
+    }
+    """
+    assert assets.minify_css(css) == "h1,h2{font-size:3rem;margin-top:0.67em}p{font-size:1.5rem !important}"
+
+
+def test_custom_css_uses_self_hosted_font(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, "STATIC", tmp_path)
+    assets.custom_css.cache_clear()
+    assert "fonts.googleapis.com" in assets.custom_css()
+
+    (tmp_path / "fonts").mkdir()
+    (tmp_path / "fonts" / "lato.css").write_text("@font-face { font-family: 'Lato'; src: url(app/static/lato.woff2); }")
+    assets.custom_css.cache_clear()
+    css = assets.custom_css()
+    assert "fonts.googleapis.com" not in css
+    assert css.startswith("@font-face{font-family:'Lato'")
+    assets.custom_css.cache_clear()
+
+
+def test_optimized_image(tmp_path, monkeypatch):
+    from PIL import Image
+
+    monkeypatch.setattr(assets, "STATIC", tmp_path / "static")
+    source = tmp_path / "banner.png"
+    Image.new("RGB", (1000, 250), "white").save(source)
+
+    urls = assets.optimized_image(str(source), widths=(500, 2000))
+
+    assert list(urls) == [500, 1000]
+    digest = assets.content_hash(source.read_bytes())
+    assert urls[500] == f"app/static/img/banner.{digest}.500.webp?v={digest}"
+    with Image.open(tmp_path / "static" / "img" / f"banner.{digest}.500.webp") as image:
+        assert image.format == "WEBP"
+        assert image.size == (500, 125)
+
+
+def test_image_html_escapes_alt(monkeypatch):
+    monkeypatch.setattr(assets, "optimized_image", lambda path: {800: "app/static/img/banner.800.webp"})
+
+    html = assets.image_html("banner.png", alt='Lawyers "prompting" <robots>')
+
+    assert 'alt="Lawyers &quot;prompting&quot; &lt;robots&gt;"' in html
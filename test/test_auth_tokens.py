@@ -0,0 +1,88 @@
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+import pytest
+
+from auth_tokens import AuthClients, ExpiredToken, InvalidToken, RefreshScheduler, TokenVerifier
+
+
+def b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def make_token(secret: str, **claims) -> str:
+    claims = {"sub": "user", "aud": "authenticated", "exp": time.time() + 3600, **claims}
+    signing_input = b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}).encode()) + "." + b64encode(
+        json.dumps(claims).encode()
+    )
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return signing_input + "." + b64encode(signature)
+
+
+def test_verifier_accepts_valid_token():
+    claims = TokenVerifier("secret").verify(make_token("secret"))
+    assert claims["sub"] == "user"
+
+
+def test_verifier_rejects_bad_tokens():
+    verifier = TokenVerifier("secret")
+    with pytest.raises(InvalidToken):
+        verifier.verify(make_token("another secret"))
+    with pytest.raises(InvalidToken):
+        verifier.verify(make_token("secret", aud="someone else"))
+    with pytest.raises(InvalidToken):
+        verifier.verify("not a token")
+    with pytest.raises(ExpiredToken):
+        verifier.verify(make_token("secret", exp=time.time() - 1))
+
+
+def test_verifier_without_secret_defers():
+    assert TokenVerifier(None).verify(make_token("secret")) is None
+
+
+def test_scheduler_refreshes_before_expiry():
+    scheduler = RefreshScheduler(margin=60)
+    refreshed = threading.Event()
+    calls = []
+
+    def refresh():
+        calls.append(time.time())
+        if len(calls) == 2:
+            refreshed.set()
+            return None
+        return time.time() + 60
+
+    scheduler.schedule("session", time.time() + 60, refresh)
+    assert refreshed.wait(2)
+    assert len(calls) == 2
+    assert "session" not in scheduler
+
+
+def test_scheduler_cancel():
+    scheduler = RefreshScheduler(margin=0)
+    calls = []
+    scheduler.schedule("session", time.time() + 0.1, lambda: calls.append(1))
+    scheduler.cancel("session")
+    time.sleep(0.2)
+    assert calls == []
+
+
+def test_auth_clients_drop_least_recently_used_and_idle_clients():
+    clients = AuthClients(lambda session_id: object(), max_clients=2, idle_timeout=0.05)
+    first = clients.get("one")
+    clients.get("two")
+    assert clients.get("one") is first
+    clients.get("three")
+    assert len(clients) == 2
+    assert clients.get("one") is first
+
+    time.sleep(0.1)
+    clients.get("four")
+    assert len(clients) == 1
+
+    clients.remove("four")
+    assert len(clients) == 0
@@ -0,0 +1,92 @@
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+
+from batch_runner import BatchRow, BatchRunner, export_csv, read_rows
+
+
+def test_read_csv_and_jsonl():
+    csv_rows = read_rows(b'\xef\xbb\xbfid,clause\n1,"The Tenant shall, at all times, pay."\n2,\n', "clauses.CSV")
+    assert [row.values for row in csv_rows] == [
+        {"id": "1", "clause": "The Tenant shall, at all times, pay."},
+        {"id": "2", "clause": ""},
+    ]
+
+    jsonl_rows = read_rows(b'{"id": 1, "clause": "Pay rent."}\n\n{"id": 2, "clause": null}\n', "clauses.jsonl")
+    assert [row.values for row in jsonl_rows] == [{"id": "1", "clause": "Pay rent."}, {"id": "2", "clause": ""}]
+
+
+@pytest.mark.parametrize(
+    "data, name, message",
+    [
+        (b"clause\n", "clauses.txt", "CSV or JSONL"),
+        (b'{"clause": "Pay"}\nnot json\n', "clauses.jsonl", "Line 2"),
+        (b'["Pay"]\n', "clauses.jsonl", "not a JSON object"),
+    ],
+)
+def test_read_rows_rejects_bad_files(data, name, message):
+    with pytest.raises(ValueError, match=message):
+        read_rows(data, name)
+
+
+def rate_limit_error():
+    response = httpx.Response(429, request=httpx.Request("POST", "http://fake/v1/chat/completions"))
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_runner_reports_statuses_and_reruns_rows_which_are_not_done():
+    failures = {"Pay rent.": rate_limit_error(), "Keep quiet.": ValueError("Bad clause")}
+
+    def generate(prompt):
+        clause = prompt.removeprefix("Simplify: ")
+        if clause in failures:
+            raise failures[clause]
+        return clause.upper()
+
+    rows = [BatchRow(index, {"clause": clause}) for index, clause in enumerate(["Pay rent.", "Keep quiet.", "Leave."])]
+    updates = [(row.index, row.status) for row in BatchRunner(generate, workers=2).run(rows, "Simplify: {clause}")]
+
+    assert [(row.status, row.attempts, row.output) for row in rows] == [
+        ("failed", 1, None),
+        ("failed", 1, None),
+        ("done", 1, "LEAVE."),
+    ]
+    assert rows[1].error == "Bad clause"
+    assert (2, "running") in updates
+
+    # Running again only sends the rows which are not done.
+    sent = []
+    list(BatchRunner(lambda prompt: sent.append(prompt) or "DONE").run(rows, "Simplify: {clause}"))
+    assert sorted(sent) == ["Simplify: Keep quiet.", "Simplify: Pay rent."]
+    assert [(row.status, row.attempts) for row in rows] == [("done", 2), ("done", 2), ("done", 1)]
+
+
+def test_runner_cancels_rows_when_the_caller_stops():
+    release = threading.Event()
+
+    def generate(prompt):
+        release.wait(5)
+        return prompt
+
+    rows = [BatchRow(index, {"clause": str(index)}) for index in range(4)]
+    run = BatchRunner(generate, workers=1).run(rows, "{clause}")
+    next(run)
+
+    start = time.monotonic()
+    run.close()
+    assert time.monotonic() - start < 1
+    assert [row.status for row in rows] == ["cancelled"] * 4
+    release.set()
+
+
+def test_export_csv():
+    row = BatchRow(0, {"clause": 'The "Tenant" shall pay.'})
+    row.status, row.attempts, row.output = "done", 1, "Pay."
+
+    assert "".join(export_csv([row])).splitlines() == [
+        "row,clause,status,attempts,output,error",
+        '1,"The ""Tenant"" shall pay.",done,1,Pay.,',
+    ]
@@ -0,0 +1,29 @@
+from exercise_history import ExerciseHistory, SimplePromptHistoryItem
+
+
+def test_history_drops_oldest_items():
+    history = ExerciseHistory(max_items=3)
+    for index in range(5):
+        history.append(SimplePromptHistoryItem(user=f"Prompt {index}"))
+
+    assert len(history) == 3
+    assert [item.user for item in history] == ["Prompt 2", "Prompt 3", "Prompt 4"]
+    assert history[-1].user == "Prompt 4"
+
+    history.remove(history[1])
+    history.remove(SimplePromptHistoryItem(user="Prompt 4"))
+    assert [item.user for item in history] == ["Prompt 2", "Prompt 4"]
+
+
+def test_repeated_prompts_are_shared():
+    prompt = "".join(["What is will ", "in ten words or less?"])
+    first = SimplePromptHistoryItem(user=prompt)
+    second = SimplePromptHistoryItem(user="".join(["What is will in ten ", "words or less?"]))
+
+    assert first.user is second.user
+
+
+def test_history_item_date():
+    item = SimplePromptHistoryItem(user="What is will?", timestamp=0)
+    assert item.date.timestamp() == 0
+    assert item.assistant is None
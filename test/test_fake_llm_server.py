@@ -0,0 +1,33 @@
+import openai
+import pytest
+
+from fake_llm_server import FakeLLMServer, LatencyProfile
+from llm import OpenAIBackend
+from openai_clients import ClientPool
+
+
+@pytest.fixture
+def server():
+    server = FakeLLMServer(profile=LatencyProfile(ttft=0, tokens_per_second=1000, tokens=5)).start()
+    yield server
+    server.stop()
+
+
+def test_backend_streams_from_fake_server(server):
+    backend = OpenAIBackend("gpt-4o-mini", ClientPool(base_url=server.base_url))
+    stream = backend.stream_chat([{"role": "user", "content": "What is will?"}], "sk-test")
+
+    assert "".join(stream) == "A will is a legal "
+    assert stream.usage.completion_tokens == 5
+
+
+def test_backend_checks_key_against_fake_server(server):
+    assert OpenAIBackend("gpt-4o-mini", ClientPool(base_url=server.base_url)).check_key("sk-test")
+
+
+def test_fake_server_injects_rate_limits(server):
+    server.profile.rate_limit_rate = 1
+    client = openai.Client(api_key="sk-test", base_url=server.base_url, max_retries=0)
+
+    with pytest.raises(openai.RateLimitError):
+        client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "Hi"}])
@@ -1,3 +1,9 @@
-def test_supabase_client():
-    from helpers import supabase_client
-    assert supabase_client is not None
+def test_auth_clients_are_per_session():
+    from helpers import auth_clients
+
+    first = auth_clients.get("session-one")
+    second = auth_clients.get("session-two")
+
+    assert first is not second
+    assert first is auth_clients.get("session-one")
+    assert first._http_client is second._http_client
@@ -0,0 +1,69 @@
+import time
+
+from history_store import HistoryWriter, SQLiteHistoryStore, apply_chat_record, chat_record, history_record
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    store = SQLiteHistoryStore(str(tmp_path / "history.sqlite3"))
+    store.save([
+        history_record("user-1", "Exercise", "simple", {"user": "What is will?", "assistant": "A document"}),
+        history_record("user-2", "Exercise", "simple", {"user": "Hi", "assistant": "Hello"}),
+        history_record("user-1", "Exercise", "chat", [{"role": "user", "content": "Hi"}], version="session:1"),
+    ])
+
+    records = store.load("user-1", "Exercise")
+    assert [record["kind"] for record in records] == ["simple", "chat"]
+    assert records[0]["data"] == {"user": "What is will?", "assistant": "A document"}
+    assert records[1]["version"] == "session:1"
+    assert store.load("user-1", "Another exercise") == []
+
+
+def test_chat_records_are_applied_a_turn_at_a_time():
+    transcript = [
+        {"role": "assistant", "content": "I'm Bob."},
+        {"role": "user", "content": "Hi Bob"},
+        {"role": "assistant", "content": "Hello"},
+    ]
+    first = chat_record(transcript, 0)
+    transcript += [{"role": "user", "content": "Who are you?"}, {"role": "assistant", "content": "A lawyer"}]
+    second = chat_record(transcript, 3)
+
+    assert second["messages"] == transcript[3:]
+    assert apply_chat_record(apply_chat_record([], first), second) == transcript
+    # Records saved before turns were saved apart hold the whole transcript.
+    assert apply_chat_record([], transcript[:1]) == transcript[:1]
+
+
+class RecordingStore:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    def save(self, records):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database is down")
+        self.batches.append(list(records))
+
+
+def test_writer_saves_in_batches():
+    store = RecordingStore()
+    writer = HistoryWriter(store, flush_interval=0.05, batch_size=2)
+
+    for index in range(3):
+        writer.put(history_record("user", "Exercise", "simple", {"index": index}))
+    writer.flush()
+
+    assert [[record["data"]["index"] for record in batch] for batch in store.batches] == [[0, 1], [2]]
+
+
+def test_writer_does_not_block_and_retries():
+    store = RecordingStore(failures=1)
+    writer = HistoryWriter(store, flush_interval=0.01)
+
+    start = time.monotonic()
+    writer.put(history_record("user", "Exercise", "simple", {"index": 0}))
+    assert time.monotonic() - start < 0.1
+
+    writer.flush()
+    assert len(store.batches) == 1
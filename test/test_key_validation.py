@@ -0,0 +1,57 @@
+import time
+
+from key_validation import KeyValidator
+
+
+def test_results_are_cached():
+    checked = []
+
+    def check(api_key):
+        checked.append(api_key)
+        return api_key == "sk-good"
+
+    validator = KeyValidator(check)
+
+    assert validator.validate("sk-good").result() is True
+    assert validator.validate("sk-bad").result() is False
+    time.sleep(0.01)
+
+    assert validator.validate("sk-good").done()
+    assert validator.validate("sk-good").result() is True
+    assert validator.validate("sk-bad").result() is False
+    assert checked == ["sk-good", "sk-bad"]
+
+
+def test_failures_expire_sooner():
+    checked = []
+
+    def check(api_key):
+        checked.append(api_key)
+        return False
+
+    validator = KeyValidator(check, failure_ttl=0)
+    validator.validate("sk-bad").result()
+    time.sleep(0.01)
+    validator.validate("sk-bad").result()
+
+    assert len(checked) == 2
+
+
+def test_expired_results_are_dropped():
+    validator = KeyValidator(lambda api_key: False, failure_ttl=0)
+    for index in range(5):
+        validator.validate(f"sk-typo-{index}").result()
+        time.sleep(0.01)
+
+    assert len(validator._results) == 1
+
+
+def test_errors_are_not_cached():
+    def check(api_key):
+        raise ConnectionError("API is down")
+
+    validator = KeyValidator(check)
+
+    assert isinstance(validator.validate("sk-good").exception(), ConnectionError)
+    time.sleep(0.01)
+    assert validator._results == {}
@@ -0,0 +1,155 @@
+import time
+from unittest import mock
+
+import httpx
+import openai
+import pytest
+
+from llm import FirstTokenTimeout, LLMBackend, ModelUnavailable, OpenAIBackend, ResilientBackend
+from rate_limit import Limits, RateLimiter
+
+
+class ScriptedBackend(LLMBackend):
+    """Answers each request with the next of its scripts: an exception to raise, or (delay, chunks) to stream."""
+
+    model = "scripted"
+
+    def __init__(self, *scripts):
+        self.scripts = list(scripts)
+        self.calls = 0
+
+    def stream_chat(self, messages, api_key, **params):
+        script = self.scripts[self.calls]
+        self.calls += 1
+        if isinstance(script, Exception):
+            raise script
+        delay, chunks = script
+
+        def stream():
+            time.sleep(delay)
+            yield from chunks
+
+        return ScriptedStream(stream())
+
+    def check_key(self, api_key):
+        return True
+
+
+class ScriptedStream:
+    usage = None
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        pass
+
+
+def rate_limit_error():
+    response = httpx.Response(429, request=httpx.Request("POST", "http://fake/v1/chat/completions"))
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def bad_request_error():
+    response = httpx.Response(400, request=httpx.Request("POST", "http://fake/v1/chat/completions"))
+    return openai.BadRequestError("Bad request", response=response, body=None)
+
+
+def stream(backend):
+    return "".join(backend.stream_chat([{"role": "user", "content": "What is will?"}], "sk-test"))
+
+
+def test_retries_rate_limits():
+    scripted = ScriptedBackend(rate_limit_error(), rate_limit_error(), (0, ["A ", "will"]))
+    backend = ResilientBackend(scripted, max_retries=2, retry_base_delay=0.01)
+
+    assert stream(backend) == "A will"
+    assert scripted.calls == 3
+
+
+def test_gives_up_after_max_retries():
+    scripted = ScriptedBackend(rate_limit_error(), rate_limit_error())
+    backend = ResilientBackend(scripted, max_retries=1, retry_base_delay=0.01)
+
+    with pytest.raises(openai.RateLimitError):
+        stream(backend)
+
+
+def test_does_not_retry_bad_requests():
+    scripted = ScriptedBackend(bad_request_error(), (0, ["A will"]))
+
+    with pytest.raises(openai.BadRequestError):
+        stream(ResilientBackend(scripted, retry_base_delay=0.01))
+    assert scripted.calls == 1
+
+
+def test_retries_when_first_token_is_late():
+    scripted = ScriptedBackend((1, ["late"]), (0, ["A will"]))
+    backend = ResilientBackend(scripted, first_token_timeout=0.1, retry_base_delay=0.01)
+    assert stream(backend) == "A will"
+
+    with pytest.raises(FirstTokenTimeout):
+        stream(ResilientBackend(ScriptedBackend((1, ["late"])), first_token_timeout=0.1, max_retries=0))
+
+
+def test_hedged_request_answers_first():
+    scripted = ScriptedBackend((1, ["slow"]), (0, ["fast"]))
+    backend = ResilientBackend(scripted, hedge=True, hedge_delay=0.05)
+
+    start = time.monotonic()
+    assert stream(backend) == "fast"
+    assert time.monotonic() - start < 0.5
+    assert scripted.calls == 2
+
+
+def test_retries_and_hedges_go_through_the_rate_limiter():
+    limiter = RateLimiter(Limits(), lambda: Limits(max_concurrent=1))
+    # The caller holds the permit of the first request, and the key may only stream once at a time.
+    permit = limiter.acquire("sk-test", 10)
+
+    scripted = ScriptedBackend(rate_limit_error(), (0, ["A will"]))
+    backend = ResilientBackend(scripted, retry_base_delay=0.01, limiter=limiter)
+    with mock.patch.object(limiter, "acquire", wraps=limiter.acquire) as acquire:
+        assert stream(backend) == "A will"
+    # The retry takes the place of the failed request, so it does not need another stream.
+    assert [call.kwargs["stream"] for call in acquire.call_args_list] == [False]
+
+    scripted = ScriptedBackend((0.2, ["slow"]), (0, ["fast"]))
+    backend = ResilientBackend(scripted, hedge=True, hedge_delay=0.05, limiter=limiter)
+    assert stream(backend) == "slow"
+    # The hedge was not sent, as the key was already streaming.
+    assert scripted.calls == 1
+
+    permit.release()
+    scripted = ScriptedBackend((0.2, ["slow"]), (0, ["fast"]))
+    backend = ResilientBackend(scripted, hedge=True, hedge_delay=0.05, limiter=limiter)
+    assert stream(backend) == "fast"
+    assert len(limiter) == 0
+
+
+def test_hedge_delay_follows_recent_first_tokens():
+    backend = ResilientBackend(ScriptedBackend(), hedge_delay=3)
+    assert backend.hedge_delay() == 3
+
+    for index in range(100):
+        backend.record_first_token(index / 100)
+    assert backend.hedge_delay() == pytest.approx(0.95)
+
+
+@pytest.mark.parametrize("status, error", [(404, openai.NotFoundError), (403, openai.PermissionDeniedError)])
+def test_check_key_reports_a_model_the_key_cannot_use(status, error):
+    pool = mock.MagicMock()
+    response = httpx.Response(status, request=httpx.Request("GET", "http://fake/v1/models/gpt-4o-mini"))
+    pool.get.return_value.models.retrieve.side_effect = error("No access", response=response, body=None)
+
+    with pytest.raises(ModelUnavailable):
+        OpenAIBackend("gpt-4o-mini", pool).check_key("sk-test")
+
+    response = httpx.Response(401, request=httpx.Request("GET", "http://fake/v1/models/gpt-4o-mini"))
+    pool.get.return_value.models.retrieve.side_effect = openai.AuthenticationError(
+        "Bad key", response=response, body=None
+    )
+    assert not OpenAIBackend("gpt-4o-mini", pool).check_key("sk-test")
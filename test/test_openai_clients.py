@@ -0,0 +1,51 @@
+import time
+
+from openai_clients import ClientPool, hash_api_key
+
+
+class FakeClient:
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_reuses_client_for_same_key():
+    pool = ClientPool(factory=FakeClient)
+    assert pool.get("sk-one") is pool.get("sk-one")
+    assert pool.get("sk-one") is not pool.get("sk-two")
+
+
+def test_pool_does_not_keep_raw_keys():
+    pool = ClientPool(factory=FakeClient)
+    pool.get("sk-secret")
+    assert "sk-secret" not in pool._clients
+    assert hash_api_key("sk-secret") in pool._clients
+
+
+def test_pool_is_bounded():
+    pool = ClientPool(max_clients=2, factory=FakeClient)
+    first = pool.get("sk-one")
+    pool.get("sk-two")
+    pool.get("sk-three")
+    assert len(pool) == 2
+    assert pool.get("sk-one") is not first
+    # It may still be streaming for a session which got it before.
+    assert not first.closed
+
+
+def test_pool_evicts_idle_clients():
+    pool = ClientPool(idle_timeout=0.01, factory=FakeClient)
+    first = pool.get("sk-one")
+    time.sleep(0.02)
+    pool.get("sk-two")
+    assert not first.closed
+    assert len(pool) == 1
+
+
+def test_pool_creates_openai_client():
+    client = ClientPool().get("sk-test")
+    assert client.api_key == "sk-test"
+
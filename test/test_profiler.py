@@ -0,0 +1,41 @@
+import cProfile
+import pstats
+
+import profiler
+from settings import settings
+
+
+def test_profiling_allowed(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILER_TOKEN", None)
+    monkeypatch.setattr(settings, "PROFILER_ADMIN_USER_IDS", [])
+    assert not profiler.profiling_allowed("1", None)
+
+    monkeypatch.setattr(settings, "PROFILER_TOKEN", "s3cret")
+    assert profiler.profiling_allowed("s3cret", None)
+    assert not profiler.profiling_allowed("guess", None)
+    assert not profiler.profiling_allowed(None, None)
+
+    monkeypatch.setattr(settings, "PROFILER_ADMIN_USER_IDS", ["admin-id"])
+    assert profiler.profiling_allowed("1", "admin-id")
+    assert not profiler.profiling_allowed("1", "learner-id")
+    assert not profiler.profiling_allowed(None, "admin-id")
+
+
+def slow_function():
+    return sum(index * index for index in range(100000))
+
+
+def test_profile_rows_and_save(tmp_path):
+    profile = cProfile.Profile()
+    profile.enable()
+    slow_function()
+    profile.disable()
+
+    rows = profiler.profile_rows(profile, limit=5)
+    assert len(rows) <= 5
+    assert any(row["function"].startswith("slow_function (test_profiler.py:") for row in rows)
+    assert [row["total seconds"] for row in rows] == sorted((row["total seconds"] for row in rows), reverse=True)
+
+    path = profiler.save_profile(profile, str(tmp_path / "profiles"), "chat_as_memory")
+    assert path.name.endswith("-chat_as_memory.prof")
+    assert pstats.Stats(str(path)).total_calls > 0
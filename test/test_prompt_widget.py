@@ -0,0 +1,68 @@
+import pytest
+
+
+class FakePlaceholder:
+    def __init__(self):
+        self.text = None
+
+    def markdown(self, text):
+        self.text = text
+
+
+def test_write_streams_consumes_all_streams():
+    from prompt_widget import write_streams
+
+    placeholders = [FakePlaceholder(), FakePlaceholder()]
+    responses = write_streams([iter(["A ", "will"]), iter(["A ", "testament"])], placeholders)
+
+    assert responses == ["A will", "A testament"]
+    assert [placeholder.text for placeholder in placeholders] == responses
+
+
+def test_write_streams_raises_stream_errors():
+    from prompt_widget import write_streams
+
+    def failing_stream():
+        yield "A "
+        raise RuntimeError("upstream error")
+
+    with pytest.raises(RuntimeError):
+        write_streams([iter(["A will"]), failing_stream()], [FakePlaceholder(), FakePlaceholder()])
+
+
+def test_coalesce_batches_chunks_by_size():
+    from prompt_widget import coalesce
+
+    chunks = ["A", " will", " is", " a", " legal", " document"]
+    batches = list(coalesce(iter(chunks), interval=60, max_chars=8))
+
+    assert batches == ["A", " will is", " a legal", " document"]
+    assert "".join(batches) == "".join(chunks)
+
+
+def test_coalesce_batches_chunks_by_time():
+    import time
+
+    from prompt_widget import coalesce
+
+    def slow_stream():
+        for chunk in ["A", " will", " is", " a"]:
+            time.sleep(0.02)
+            yield chunk
+
+    assert list(coalesce(slow_stream(), interval=0, max_chars=1000)) == ["A", " will", " is", " a"]
+    assert list(coalesce(slow_stream(), interval=60, max_chars=1000)) == ["A", " will is a"]
+
+
+def test_exercises_keep_the_login_in_use(monkeypatch):
+    import time
+
+    import prompt_widget
+    from auth_tokens import AuthSession
+
+    auth_session = AuthSession("access", "refresh", time.time() + 3600)
+    auth_session.last_seen -= 3600
+    monkeypatch.setattr(prompt_widget.st, "session_state", {"auth_session": auth_session})
+
+    prompt_widget.touch_auth_session()
+    assert auth_session.idle() < 1
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from openai_clients import hash_api_key
+from rate_limit import Limits, QueueTimeout, RateLimiter, TokenBucket
+
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(rate=10, capacity=10)
+    now = time.monotonic()
+    assert bucket.wait_time(10, now) == 0
+    bucket.take(10, now)
+    assert bucket.wait_time(5, now) == pytest.approx(0.5)
+    assert bucket.wait_time(5, now + 0.5) == pytest.approx(0)
+
+
+def test_limiter_caps_concurrent_streams_and_reports_position():
+    limiter = RateLimiter(Limits(max_concurrent=1), Limits)
+    first = limiter.acquire("sk-one", 10)
+
+    positions = []
+    acquired = threading.Event()
+
+    def wait():
+        with limiter.acquire("sk-two", 10, on_wait=positions.append):
+            acquired.set()
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    time.sleep(0.05)
+    assert not acquired.is_set()
+    assert len(limiter) == 1
+
+    first.release()
+    thread.join(1)
+    assert acquired.is_set()
+    assert positions == [1, 0]
+
+
+def test_limiter_limits_requests_per_key():
+    limiter = RateLimiter(Limits(), lambda: Limits(requests_per_second=20))
+
+    start = time.monotonic()
+    for _ in range(25):
+        limiter.acquire("sk-one", 10).release()
+    assert time.monotonic() - start >= 0.2
+
+    start = time.monotonic()
+    limiter.acquire("sk-two", 10).release()
+    assert time.monotonic() - start < 0.05
+
+
+def test_key_over_its_limits_does_not_hold_up_other_keys():
+    limiter = RateLimiter(Limits(), lambda: Limits(max_concurrent=1))
+    first = limiter.acquire("sk-one", 10)
+
+    acquired = threading.Event()
+
+    def wait():
+        with limiter.acquire("sk-one", 10):
+            acquired.set()
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    time.sleep(0.05)
+    assert len(limiter) == 1
+
+    start = time.monotonic()
+    limiter.acquire("sk-two", 10).release()
+    assert time.monotonic() - start < 0.05
+    assert not acquired.is_set()
+
+    first.release()
+    thread.join(1)
+    assert acquired.is_set()
+
+
+def test_limiter_charges_generated_tokens():
+    limiter = RateLimiter(Limits(tokens_per_minute=600), Limits)
+    with limiter.acquire("sk-one", 100) as permit:
+        permit.record(500)
+
+    with pytest.raises(QueueTimeout):
+        limiter.acquire("sk-one", 100, timeout=0.1)
+    assert len(limiter) == 0
+
+
+def test_limiter_drops_keys_which_are_as_good_as_new():
+    limiter = RateLimiter(
+        Limits(), lambda: Limits(requests_per_second=1000, tokens_per_minute=60000), sweep_interval=0
+    )
+    for index in range(100):
+        with limiter.acquire(f"sk-{index}", 10) as permit:
+            permit.record(20)
+    held = limiter.acquire("sk-streaming", 10)
+
+    time.sleep(0.1)
+    limiter.acquire("sk-last", 10).release()
+    assert set(limiter._keys) == {hash_api_key("sk-streaming"), hash_api_key("sk-last")}
+    held.release()
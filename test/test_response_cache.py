@@ -0,0 +1,41 @@
+import time
+
+from response_cache import ResponseCache, replay
+
+
+def test_cache_key_depends_on_messages_and_params():
+    messages = [{"role": "user", "content": "What is will?"}]
+    key = ResponseCache.make_key("gpt-4o-mini", messages)
+    assert key == ResponseCache.make_key("gpt-4o-mini", [dict(messages[0])])
+    assert key != ResponseCache.make_key("gpt-4o-mini", messages, temperature=0)
+    assert key != ResponseCache.make_key("gpt-4o", messages)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+
+
+def test_cache_expires_entries():
+    cache = ResponseCache(ttl=0.01)
+    cache.set("a", "1")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_cache_persists_to_sqlite(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    ResponseCache(path=path).set("a", "A will is a legal document.")
+    assert ResponseCache(path=path).get("a") == "A will is a legal document."
+
+
+def test_replay_reproduces_text():
+    text = "A will is  a legal document.\n\nIt sets out your wishes."
+    assert "".join(replay(text)) == text
+    assert len(list(replay(text))) > 1
@@ -0,0 +1,88 @@
+import json
+
+from response_pool import Prewarmer, ResponsePool, ScriptedExercise, find_scripted_exercises
+
+
+def test_find_scripted_exercises(tmp_path):
+    page = tmp_path / "page.py"
+    page.write_text(
+        """
+from prompt_widget import chat_prompt, matrix_prompt, simple_prompt
+
+exercise_2 = "Drafting"
+simple_prompt(exercise_2, default_text="Draft a will " "for me.")
+simple_prompt("Free text")
+simple_prompt("Computed", default_text=exercise_2.upper())
+matrix_prompt("Matrix", template="{context} What is will?", values=["At a party.", "At a party."])
+matrix_prompt("Two slots", template="{context} What is {word}?", values=["At a party."])
+matrix_prompt("Too many", template="{context} Who is Bob?", values=["At a party.", "In court."])
+matrix_prompt("Allowed", variants=["Who is Alice?", "Who is Eve?"], max_variants=2)
+simple_prompt("Random", default_text="Pick a number.", cache=False)
+chat_prompt(
+    "Chat",
+    history=[{"role": "system", "content": "You are a lawyer."}],
+    steps=["What is a will?", "Who can make one?"],
+)
+chat_prompt("Long chat", steps=["Take these notes."], token_budget=500, pinned=0)
+"""
+    )
+
+    assert find_scripted_exercises(str(page), chat_token_budget=2000, max_variants=1) == [
+        ScriptedExercise([], ["Draft a will for me."]),
+        ScriptedExercise([], ["At a party. What is will?"]),
+        ScriptedExercise([], ["Who is Alice?"]),
+        ScriptedExercise([], ["Who is Eve?"]),
+        ScriptedExercise(
+            [{"role": "system", "content": "You are a lawyer."}], ["What is a will?", "Who can make one?"], 2000, 1
+        ),
+        ScriptedExercise([], ["Take these notes."], 500, 0),
+    ]
+
+
+def test_finds_exercises_in_course_pages():
+    assert find_scripted_exercises("content/pages/chat_as_memory.py")
+
+
+def test_sample_picks_different_responses():
+    pool = ResponsePool()
+    pool.set("key", ["A", "B", "C"])
+
+    assert sorted(pool.sample("key", 3)) == ["A", "B", "C"]
+    assert pool.sample("key", 4) is None
+    assert pool.sample("other") is None
+
+
+def test_prewarm_follows_each_response_through_the_steps():
+    calls = []
+
+    def generate(messages):
+        calls.append(messages)
+        return f"answer {len(calls)}"
+
+    pool = ResponsePool()
+    prewarmer = Prewarmer(pool, generate, json.dumps, size=2)
+    prewarmer.prewarm(ScriptedExercise([{"role": "system", "content": "Be brief."}], ["First", "Second"]))
+
+    first = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "First"}]
+    assert sorted(pool.sample(json.dumps(first), 2)) == ["answer 1", "answer 2"]
+    for answer in ("answer 1", "answer 2"):
+        second = first + [{"role": "assistant", "content": answer}, {"role": "user", "content": "Second"}]
+        assert pool.sample(json.dumps(second)) is not None
+    assert len(calls) == 4
+
+
+def test_prewarm_trims_chats_to_the_exercise_budget():
+    calls = []
+
+    def generate(messages):
+        calls.append(messages)
+        return "A will is a legal document. " * 10
+
+    pool = ResponsePool()
+    prewarmer = Prewarmer(pool, generate, json.dumps, size=1)
+    notes = [{"role": "user", "content": "Note"}, {"role": "assistant", "content": "OK"}]
+    prewarmer.prewarm(ScriptedExercise(notes, ["First", "Second"], token_budget=40, pinned=0))
+
+    # The first turn and its long answer were trimmed from the second step, as the widget would.
+    assert calls[1] == [{"role": "user", "content": "Second"}]
+    assert pool.sample(json.dumps(calls[1])) is not None
@@ -0,0 +1,31 @@
+import pytest
+
+from routes import Page, RouteRegistry, Section, data_pages, route_registry
+
+
+def test_registry_orders_pages_without_changing_manifest():
+    sections = [
+        Section(title="Second", section_order=2, pages=[Page(path="main.py")]),
+        Section(title="First", section_order=1, pages=[
+            Page(title="B", page_order=1, path="helpers.py"),
+            Page(title="A", page_order=0, path="routes.py"),
+        ]),
+    ]
+    registry = RouteRegistry(sections)
+
+    assert [page.path for page in registry.pages] == ["routes.py", "helpers.py", "main.py"]
+    assert [page.title for page in sections[1].pages] == ["B", "A"]
+    assert registry.index["main.py"] == 2
+
+
+def test_registry_links():
+    pages = route_registry.pages
+    assert route_registry.links[pages[0].path] == (None, pages[1])
+    assert route_registry.links[pages[1].path] == (pages[0], pages[2])
+    assert route_registry.links[pages[-1].path] == (pages[-2], None)
+    assert len(route_registry.pages) == sum(len(section.pages) for section in data_pages)
+
+
+def test_registry_checks_page_files():
+    with pytest.raises(FileNotFoundError):
+        RouteRegistry([Section(pages=[Page(path="content/pages/missing.py")])])
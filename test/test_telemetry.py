@@ -0,0 +1,36 @@
+import json
+
+from telemetry import Metrics
+
+
+def test_render_counters_and_histograms():
+    metrics = Metrics()
+    metrics.inc("llm_prompt_tokens_total", 12, model="gpt-4o-mini")
+    metrics.observe("llm_response_seconds", 0.3, model="gpt-4o-mini")
+    metrics.observe("llm_response_seconds", 2, model="gpt-4o-mini")
+
+    text = metrics.render()
+
+    assert 'llm_prompt_tokens_total{model="gpt-4o-mini"} 12' in text
+    assert 'llm_response_seconds_bucket{model="gpt-4o-mini",le="0.5"} 1' in text
+    assert 'llm_response_seconds_bucket{model="gpt-4o-mini",le="+Inf"} 2' in text
+    assert 'llm_response_seconds_count{model="gpt-4o-mini"} 2' in text
+
+
+def test_timer_observes_elapsed_time():
+    metrics = Metrics()
+    with metrics.timer("welcome_mat_seconds") as timer:
+        pass
+
+    assert timer.elapsed is not None
+    assert "welcome_mat_seconds_count 1" in metrics.render()
+
+
+def test_measurements_are_logged_to_jsonl(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    metrics = Metrics(jsonl_path=str(path))
+    metrics.observe("page_run_seconds", 0.1, page="completion")
+
+    record = json.loads(path.read_text().splitlines()[0])
+    assert record["name"] == "page_run_seconds"
+    assert record["labels"] == {"page": "completion"}
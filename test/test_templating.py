@@ -0,0 +1,28 @@
+import pytest
+
+from templating import expand_template, fill_template, template_fields, unique_variants
+
+
+def test_templates():
+    template = "Rewrite {clause} for {audience}. Keep {{braces}}."
+    assert template_fields(template) == {"clause", "audience"}
+    filled = fill_template(template, {"clause": "this", "audience": "tenants"})
+    assert filled == "Rewrite this for tenants. Keep {braces}."
+    with pytest.raises(ValueError, match="audience"):
+        fill_template(template, {"clause": "this"})
+    with pytest.raises(ValueError, match="cannot be filled in"):
+        fill_template("Rewrite {clause.text}", {"clause": "this"})
+
+
+def test_variants():
+    assert expand_template("{context} What is will? Keep {{braces}}.", ["At a party.", " ", "In court. "]) == [
+        "At a party. What is will? Keep {braces}.",
+        "In court. What is will? Keep {braces}.",
+    ]
+    with pytest.raises(ValueError, match="exactly one slot"):
+        expand_template("{context} What is {word}?", ["At a party."])
+
+    assert unique_variants(["What is will?", "", "What is  will? ", "What is a will?"]) == [
+        "What is will?",
+        "What is a will?",
+    ]
@@ -0,0 +1,48 @@
+from token_budget import count_message_tokens, count_tokens, trim_messages
+
+
+def test_count_tokens():
+    assert count_tokens("") == 0
+    assert count_tokens("What is will?") == 4
+    assert count_tokens("Confidentiality") == 4
+
+
+def test_messages_under_budget_are_not_trimmed():
+    messages = [
+        {"role": "system", "content": "You are a note taker."},
+        {"role": "user", "content": "9:30am. Mediation starts."},
+    ]
+    assert trim_messages(messages, count_message_tokens(messages)) == messages
+
+
+def test_trim_keeps_system_pinned_and_latest_messages():
+    messages = [
+        {"role": "system", "content": "You are a note taker."},
+        {"role": "user", "content": 'Say "OK" to all my notes.'},
+        {"role": "assistant", "content": "Yes, I understand."},
+        {"role": "user", "content": "Plaintiff's opening statement " * 20},
+        {"role": "assistant", "content": "OK"},
+        {"role": "user", "content": "Summarise the mediation."},
+    ]
+    trimmed = trim_messages(messages, 60, pinned=3)
+
+    assert trimmed == messages[:3] + messages[5:]
+    assert count_message_tokens(trimmed) <= 60
+
+
+def test_trim_drops_oldest_messages_first():
+    messages = [{"role": "user", "content": f"Note number {index}"} for index in range(10)]
+    trimmed = trim_messages(messages, count_message_tokens(messages[-3:]))
+
+    assert trimmed == messages[-3:]
+
+
+def test_trim_drops_replies_with_their_prompts():
+    messages = []
+    for index in range(4):
+        messages.append({"role": "user", "content": f"Note number {index}"})
+        messages.append({"role": "assistant", "content": "OK"})
+    messages.append({"role": "user", "content": "Summarise the notes."})
+    trimmed = trim_messages(messages, count_message_tokens(messages) - 1)
+
+    assert trimmed == messages[2:]
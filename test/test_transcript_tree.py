@@ -0,0 +1,66 @@
+from transcript_tree import TranscriptTree
+
+HISTORY = [
+    {"role": "user", "content": 'Say "OK" to all my notes.'},
+    {"role": "assistant", "content": "Yes, I understand."},
+]
+
+
+def test_versions_share_common_messages():
+    tree = TranscriptTree(HISTORY)
+    tree.append(0, {"role": "user", "content": "9:30am. Mediation starts."})
+    tree.append(0, {"role": "assistant", "content": "OK"})
+
+    version = tree.reset()
+    tree.append(version, {"role": "user", "content": "9:30am. Mediation starts."})
+
+    assert len(tree) == 2
+    assert tree.messages(0)[:3] == tree.messages(version)
+    assert all(a is b for a, b in zip(tree.nodes(0), tree.nodes(version)))
+
+
+def test_reset_starts_from_history():
+    tree = TranscriptTree(HISTORY)
+    tree.append(0, {"role": "user", "content": "Hello"})
+
+    version = tree.reset()
+
+    assert tree.messages(version) == HISTORY
+    assert tree.messages(0)[-1] == {"role": "user", "content": "Hello"}
+
+
+def test_fork_from_earlier_message():
+    tree = TranscriptTree(HISTORY)
+    for content in ["First note", "OK", "Second note", "OK"]:
+        tree.append(0, {"role": "user" if content != "OK" else "assistant", "content": content})
+
+    assert tree.messages(tree.fork(0, 0)) == []
+
+    version = tree.fork(0, 4)
+    tree.append(version, {"role": "user", "content": "A different second note"})
+
+    assert [message["content"] for message in tree.messages(version)][2:] == [
+        "First note", "OK", "A different second note"
+    ]
+    assert len(tree.messages(0)) == 6
+    assert tree.count(version, "user", start=len(HISTORY)) == 2
+
+
+def test_history_is_not_modified():
+    history = [dict(message) for message in HISTORY]
+    tree = TranscriptTree(history)
+    tree.append(0, {"role": "user", "content": "Hello"})
+
+    assert history == HISTORY
+
+
+def test_add_version_shares_messages():
+    tree = TranscriptTree([{"role": "system", "content": "You are Bob."}])
+    version = tree.add_version([
+        {"role": "system", "content": "You are Bob."},
+        {"role": "user", "content": "Hi"},
+    ])
+
+    assert version == 1
+    assert tree.messages(version)[-1] == {"role": "user", "content": "Hi"}
+    assert tree.nodes(version)[0] is tree.base
@@ -0,0 +1,63 @@
+import math
+import re
+
+# Every message costs a few tokens on top of its content, and every reply is primed with a few more.
+# See https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+_WORDS = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in text without calling out to the network.
+    Words are counted as one token per four characters and punctuation as one token each, which slightly
+    overestimates the count for English text.
+    """
+    return sum(max(1, math.ceil(len(word) / 4)) for word in _WORDS.findall(text))
+
+
+def count_message_tokens(messages: list[dict]) -> int:
+    return TOKENS_PER_REPLY + sum(
+        TOKENS_PER_MESSAGE + count_tokens(message["content"]) for message in messages
+    )
+
+
+def trim_messages(messages: list[dict], budget: int, pinned: int = 0) -> list[dict]:
+    """
+    Drops the oldest turns until messages fit into the token budget, like a sliding window. A turn is a user message
+    with the assistant messages answering it, so that no reply is sent without its prompt.
+
+    System messages, the first ``pinned`` messages and the turn of the latest message are never dropped, so the result
+    may still be over budget if they do not fit on their own.
+    """
+    protected = {
+        index
+        for index, message in enumerate(messages)
+        if index < pinned or message["role"] == "system"
+    }
+    protected.add(len(messages) - 1)
+
+    turns = []
+    for index, message in enumerate(messages):
+        if index in protected:
+            continue
+        if message["role"] == "assistant" and turns and turns[-1][-1] == index - 1:
+            turns[-1].append(index)
+        else:
+            turns.append([index])
+    # When the latest message is a reply, its prompt is kept with it.
+    if messages and messages[-1]["role"] == "assistant" and turns and turns[-1][-1] == len(messages) - 2:
+        turns.pop()
+
+    total = count_message_tokens(messages)
+    dropped = set()
+
+    for turn in turns:
+        if total <= budget:
+            break
+        total -= sum(TOKENS_PER_MESSAGE + count_tokens(messages[index]["content"]) for index in turn)
+        dropped.update(turn)
+
+    return [message for index, message in enumerate(messages) if index not in dropped]
@@ -0,0 +1,83 @@
+from typing import Optional
+
+
+class MessageNode:
+    """A message in a transcript. Its parent is the message before it."""
+
+    __slots__ = ("message", "parent", "children")
+
+    def __init__(self, message: dict, parent: Optional["MessageNode"]):
+        self.message = message
+        self.parent = parent
+        self.children: Optional[dict[tuple[str, str], MessageNode]] = None
+
+
+class TranscriptTree:
+    """
+    The versions of a chat exercise, stored as a prefix tree of messages.
+
+    A version is the last message of its transcript, and the transcript is found by walking back to the first
+    message. Versions which start with the same messages share them, so memory grows with the number of distinct
+    messages rather than with the number of versions times their length.
+    """
+
+    def __init__(self, history: list[dict]):
+        self._roots: dict[tuple[str, str], MessageNode] = {}
+        self.base: Optional[MessageNode] = None
+        for message in history:
+            self.base = self._child(self.base, message)
+        self.versions: list[Optional[MessageNode]] = [self.base]
+
+    def _child(self, parent: Optional[MessageNode], message: dict) -> MessageNode:
+        key = (message["role"], message["content"])
+        if parent is None:
+            children = self._roots
+        else:
+            if parent.children is None:
+                parent.children = {}
+            children = parent.children
+
+        if key not in children:
+            children[key] = MessageNode({"role": message["role"], "content": message["content"]}, parent)
+        return children[key]
+
+    def __len__(self) -> int:
+        return len(self.versions)
+
+    def append(self, version: int, message: dict):
+        self.versions[version] = self._child(self.versions[version], message)
+
+    def nodes(self, version: int) -> list[MessageNode]:
+        nodes = []
+        node = self.versions[version]
+        while node is not None:
+            nodes.append(node)
+            node = node.parent
+        nodes.reverse()
+        return nodes
+
+    def messages(self, version: int) -> list[dict]:
+        """The messages of a version, first to last. The messages are shared, so do not modify them."""
+        return [node.message for node in self.nodes(version)]
+
+    def reset(self) -> int:
+        """Starts a new version from the exercise's history and returns it."""
+        self.versions.append(self.base)
+        return len(self.versions) - 1
+
+    def add_version(self, messages: list[dict]) -> int:
+        """Adds a version with the given messages, e.g. one saved in an earlier session, and returns it."""
+        node = None
+        for message in messages:
+            node = self._child(node, message)
+        self.versions.append(node)
+        return len(self.versions) - 1
+
+    def fork(self, version: int, length: int) -> int:
+        """Starts a new version with the first length messages of version and returns it."""
+        self.versions.append(self.nodes(version)[length - 1] if length > 0 else None)
+        return len(self.versions) - 1
+
+    def count(self, version: int, role: str, start: int = 0) -> int:
+        """Counts the messages from role in version, skipping the first ``start`` messages."""
+        return sum(1 for node in self.nodes(version)[start:] if node.message["role"] == role)